@@ -1,8 +1,16 @@
-import json
+import argparse
 import os
+import sys
 from datetime import datetime, timedelta
 import yfinance as yf
 from pathlib import Path
+from tse_tickers import is_possible_ticker, get_ticker_sector
+from trading_calendar import next_trading_day, previous_trading_day, session_has_closed
+import signal_index
+from profiling import StageProfiler, PROFILE_MODES
+from universes import is_default, iter_prediction_files, processed_key
+from storage import (atomic_write_json, file_lock, load_json, remove_path, single_instance,
+                     AlreadyRunningError, CorruptFileError, StorageError)
 
 # 加载配置
 try:
@@ -16,67 +24,100 @@ PREDICTIONS_DIR = "./predictions"
 CUMULATIVE_STATS_FILE = "./backtest_cumulative_stats.json"  # 累计统计文件
 
 def load_cumulative_stats():
-    """加载累计统计数据"""
-    if os.path.exists(CUMULATIVE_STATS_FILE):
-        try:
-            with open(CUMULATIVE_STATS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
+    """
+    加载累计统计数据
+    文件损坏时抛出 CorruptFileError 并保留原文件，不会静默重置为零
+    """
+    stats = load_json(CUMULATIVE_STATS_FILE, quarantine_corrupt=False)
+    if stats is not None:
+        return stats
 
-    # 默认初始值
+    # 默认初始值（仅在文件不存在时）
     return {
         "total_predictions": 0,
         "correct_predictions": 0,
         "total_return": 0.0,
-        "processed_dates": [],  # 已处理过的日期列表
+        "processed_dates": [],  # 已处理过的日期列表（非默认 universe 记为 <名称>/<日期>）
+        "method_stats": {},  # 按研判/解析方式分组的统计（json/regex 为 Gemini，local 为本地词典评分）
+        "sector_stats": {},  # 按33业种分组的统计
+        "universe_stats": {},  # 按 universe 分组的统计
         "last_updated": None,
         "history": []  # 保留最近的详细记录
     }
 
 def save_cumulative_stats(stats):
-    """保存累计统计数据"""
-    with open(CUMULATIVE_STATS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(stats, f, ensure_ascii=False, indent=2)
+    """原子写入累计统计数据"""
+    atomic_write_json(CUMULATIVE_STATS_FILE, stats)
     print(f"✅ 累计统计已更新: {CUMULATIVE_STATS_FILE}")
 
+def update_group_stats(groups, key, is_correct, return_rate):
+    """更新分组统计（按解析方式、板块等维度）"""
+    group = groups.setdefault(key, {"total": 0, "correct": 0, "total_return": 0.0})
+    group["total"] += 1
+    if is_correct:
+        group["correct"] += 1
+    group["total_return"] += return_rate
+
+def print_group_stats(title, groups):
+    """打印分组统计"""
+    if not groups:
+        return
+    print(f"\n{title}:")
+    for key, group in sorted(groups.items(), key=lambda kv: -kv[1]["total"]):
+        if group["total"] == 0:
+            continue
+        accuracy = group["correct"] / group["total"] * 100
+        avg_return = group["total_return"] / group["total"]
+        line = f"   {key:<12} 次数 {group['total']:<4} 正确率 {accuracy:6.2f}%  平均收益 {avg_return:+.2f}%"
+        if group.get("files"):
+            line += f"  平均解析耗时 {group['latency_ms_total'] / group['files']:.2f} ms"
+        print(line)
+
+def get_session_window(target_date):
+    """
+    预测日期对应的交易日及其前一交易日
+    预测日期本身不是交易日时（如周末模式以周六为标识），顺延到下一个交易日
+    返回: (前一交易日, 目标交易日)
+    """
+    session = next_trading_day(target_date, inclusive=True)
+    return previous_trading_day(session), session
+
+# 进程内价格缓存：多个 universe 预测同一只股票、同一交易日时只请求一次
+_price_cache = {}
+
 def get_stock_performance(stock_code, target_date):
     """
-    获取股票在目标日期的涨跌情况
+    获取股票在目标日期的涨跌情况（目标交易日收盘价 vs 前一交易日收盘价）
+    按交易日历只请求这两个交易日的数据，结果按 (股票, 交易日) 缓存
     返回: (涨跌幅百分比, 是否成功获取)
     """
     try:
-        target = datetime.strptime(target_date, '%Y-%m-%d')
-        start_date = (target - timedelta(days=5)).strftime('%Y-%m-%d')
-        end_date = (target + timedelta(days=2)).strftime('%Y-%m-%d')
+        prev_session, session = get_session_window(target_date)
+    except ValueError as e:
+        print(f"  ❌ 无法确定 {target_date} 对应的交易日: {e}")
+        return None, False
 
-        ticker = yf.Ticker(stock_code)
-        hist = ticker.history(start=start_date, end=end_date)
+    key = (stock_code, session)
+    if key not in _price_cache:
+        _price_cache[key] = fetch_session_change(stock_code, prev_session, session)
+    return _price_cache[key]
 
-        if len(hist) < 2:
+def fetch_session_change(stock_code, prev_session, session):
+    """从 yfinance 获取两个交易日的收盘价并计算涨跌幅"""
+    try:
+        ticker = yf.Ticker(stock_code)
+        # yfinance 的 end 不包含当天
+        hist = ticker.history(start=prev_session.strftime('%Y-%m-%d'),
+                              end=(session + timedelta(days=1)).strftime('%Y-%m-%d'))
+
+        closes = dict(zip(hist.index.strftime('%Y-%m-%d'), hist['Close']))
+        prev_close = closes.get(prev_session.strftime('%Y-%m-%d'))
+        target_close = closes.get(session.strftime('%Y-%m-%d'))
+        if prev_close is None or target_close is None:
             return None, False
 
-        target_str = target.strftime('%Y-%m-%d')
-
-        if target_str in hist.index.strftime('%Y-%m-%d'):
-            idx = list(hist.index.strftime('%Y-%m-%d')).index(target_str)
-            if idx > 0:
-                prev_close = hist.iloc[idx - 1]['Close']
-                target_close = hist.iloc[idx]['Close']
-                change_pct = ((target_close - prev_close) / prev_close) * 100
-                return round(change_pct, 2), True
-
-        available_dates = hist.index.strftime('%Y-%m-%d').tolist()
-        for date_str in available_dates:
-            if date_str >= target_str:
-                idx = available_dates.index(date_str)
-                if idx > 0:
-                    prev_close = hist.iloc[idx - 1]['Close']
-                    target_close = hist.iloc[idx]['Close']
-                    change_pct = ((target_close - prev_close) / prev_close) * 100
-                    return round(change_pct, 2), True
-
-        return None, False
+        change_pct = ((target_close - prev_close) / prev_close) * 100
+        return round(change_pct, 2), True
 
     except Exception as e:
         print(f"  ❌ 获取 {stock_code} 数据失败: {e}")
@@ -99,25 +140,27 @@ def evaluate_prediction(prediction, actual_change):
     return is_correct, return_rate
 
 def clean_old_files():
-    """清理旧的预测和报告文件，只保留最近 KEEP_DAYS 天的"""
+    """
+    清理旧的预测和报告文件，只保留最近 KEEP_DAYS 天的
+    每个文件在其锁内删除，不会删掉正在被写入的文件
+    """
     cutoff_date = datetime.now() - timedelta(days=KEEP_DAYS)
 
     deleted_count = 0
 
-    # 清理旧的预测文件
+    # 清理旧的预测文件（含各 universe 子目录）
     if os.path.exists(PREDICTIONS_DIR):
-        for pred_file in Path(PREDICTIONS_DIR).glob("prediction_*.json"):
+        for _, pred_file in iter_prediction_files(PREDICTIONS_DIR):
             try:
                 # 从文件名提取日期 prediction_2026-02-05.json
                 date_str = pred_file.stem.replace("prediction_", "")
                 file_date = datetime.strptime(date_str, '%Y-%m-%d')
 
-                if file_date < cutoff_date:
-                    pred_file.unlink()
+                if file_date < cutoff_date and remove_path(str(pred_file)):
                     deleted_count += 1
-                    print(f"  🗑️  删除旧预测: {pred_file.name}")
-            except:
-                pass
+                    print(f"  🗑️  删除旧预测: {pred_file.relative_to(PREDICTIONS_DIR)}")
+            except ValueError:
+                continue
 
     # 清理旧的报告目录
     for report_dir in Path(".").glob("report_*"):
@@ -127,13 +170,11 @@ def clean_old_files():
                 date_str = report_dir.name.replace("report_", "")
                 file_date = datetime.strptime(date_str, '%Y%m%d')
 
-                if file_date < cutoff_date:
-                    import shutil
-                    shutil.rmtree(report_dir)
+                if file_date < cutoff_date and remove_path(str(report_dir)):
                     deleted_count += 1
                     print(f"  🗑️  删除旧报告: {report_dir.name}/")
-            except:
-                pass
+            except ValueError:
+                continue
 
     # 清理旧的回测结果文件
     for backtest_file in Path(".").glob("backtest_result_*.json"):
@@ -144,12 +185,11 @@ def clean_old_files():
                 date_str = parts[0]
                 file_date = datetime.strptime(date_str, '%Y%m%d')
 
-                if file_date < cutoff_date:
-                    backtest_file.unlink()
+                if file_date < cutoff_date and remove_path(str(backtest_file)):
                     deleted_count += 1
                     print(f"  🗑️  删除旧回测: {backtest_file.name}")
-        except:
-            pass
+        except ValueError:
+            continue
 
     if deleted_count > 0:
         print(f"\n✅ 清理完成，删除了 {deleted_count} 个旧文件")
@@ -158,6 +198,11 @@ def clean_old_files():
 
 def run_incremental_backtest():
     """运行增量回测：只处理新的预测文件"""
+    # 读取到保存累计统计的整个过程持有锁，重叠的回测不会重复计数
+    with file_lock(CUMULATIVE_STATS_FILE):
+        _run_incremental_backtest()
+
+def _run_incremental_backtest():
     print("=" * 60)
     print("开始增量回测...")
     print("=" * 60)
@@ -180,19 +225,16 @@ def run_incremental_backtest():
     print(f"   已处理日期数: {len(processed_dates)}")
     print()
 
-    # 读取所有预测文件
-    prediction_files = sorted([
-        f for f in Path(PREDICTIONS_DIR).glob("prediction_*.json")
-        if "backup" not in str(f)
-    ])
+    # 读取所有 universe 的预测文件
+    prediction_files = list(iter_prediction_files(PREDICTIONS_DIR))
 
     if not prediction_files:
         print(f"❌ 未找到预测文件")
         return
 
     # 只处理未处理过的文件
-    new_files = [f for f in prediction_files
-                 if f.stem.replace("prediction_", "") not in processed_dates]
+    new_files = [(universe, f) for universe, f in prediction_files
+                 if processed_key(universe, f.stem.replace("prediction_", "")) not in processed_dates]
 
     if not new_files:
         print("✅ 没有新的预测需要回测")
@@ -202,11 +244,15 @@ def run_incremental_backtest():
 
     new_results = []
 
-    for pred_file in new_files:
-        print(f"处理文件: {pred_file.name}")
+    for universe, pred_file in new_files:
+        print(f"处理文件: {pred_file.name}" + ("" if is_default(universe) else f"（universe: {universe}）"))
 
-        with open(pred_file, 'r', encoding='utf-8') as f:
-            pred_data = json.load(f)
+        # 损坏的预测文件改名留档后跳过，不中断整个回测
+        try:
+            pred_data = load_json(str(pred_file))
+        except CorruptFileError as e:
+            print(f"  ❌ {e}，跳过")
+            continue
 
         date = pred_data.get('date')
         prediction_info = pred_data.get('prediction')
@@ -215,6 +261,28 @@ def run_incremental_backtest():
             print(f"  ⚠️  未找到预测信息，跳过")
             continue
 
+        # 对应交易日尚未收盘时不回测，也不标记为已处理
+        # 日期缺失、格式错误或超出交易日历范围时跳过该文件，不中断整个回测
+        try:
+            if not date:
+                raise ValueError("缺少 date 字段")
+            _, session = get_session_window(date)
+        except ValueError as e:
+            print(f"  ❌ 无法确定对应的交易日，跳过: {e}")
+            continue
+        if not session_has_closed(session):
+            print(f"  ⏳ 对应交易日 {session} 尚未收盘，下次再回测")
+            continue
+
+        # 预测解析方式（旧文件没有该字段，均为正则提取）
+        extraction = pred_data.get('extraction') or {"method": "regex"}
+        method = extraction.get('method', 'regex')
+        method_group = cumulative.setdefault("method_stats", {}).setdefault(
+            method, {"total": 0, "correct": 0, "total_return": 0.0})
+        if extraction.get('latency_ms') is not None:
+            method_group["files"] = method_group.get("files", 0) + 1
+            method_group["latency_ms_total"] = method_group.get("latency_ms_total", 0.0) + extraction['latency_ms']
+
         # 处理预测（支持单个或多个股票）
         predictions_list = [prediction_info] if isinstance(prediction_info, dict) else prediction_info
 
@@ -231,6 +299,12 @@ def run_incremental_backtest():
             if len(predictions_list) > 1:
                 print(f"  股票 {idx}/{len(predictions_list)}: {stock_code}")
 
+            # 主表校验：不存在的代码直接跳过，省去一次 yfinance 请求
+            if not is_possible_ticker(stock_code):
+                print(f"  ⚠️  {stock_code} 不是有效的东证代码，跳过")
+                continue
+            sector = pred.get('sector') or get_ticker_sector(stock_code)
+
             # 获取实际表现 - 使用预测日期date而不是target_date
             actual_change, success = get_stock_performance(stock_code, date)
 
@@ -258,19 +332,25 @@ def run_incremental_backtest():
             print(f", 收益: {return_rate:+.2f}%")
 
             cumulative["total_return"] += return_rate
+            update_group_stats(cumulative["method_stats"], method, is_correct, return_rate)
+            update_group_stats(cumulative.setdefault("sector_stats", {}), sector, is_correct, return_rate)
+            update_group_stats(cumulative.setdefault("universe_stats", {}), universe, is_correct, return_rate)
 
             # 记录详细结果（只保留最近的）
             new_results.append({
+                "universe": universe,
                 "date": date,
                 "stock_code": stock_code,
                 "prediction": direction,
+                "sector": sector,
+                "method": method,
                 "actual_change": float(actual_change),
                 "is_correct": bool(is_correct),
                 "return_rate": float(return_rate)
             })
 
         # 标记为已处理
-        processed_dates.add(date)
+        processed_dates.add(processed_key(universe, date))
         print()
 
     # 更新历史记录（只保留最近的）
@@ -282,6 +362,13 @@ def run_incremental_backtest():
     # 保存累计统计
     save_cumulative_stats(cumulative)
 
+    # 回测结果写入信号索引（失败不影响回测，可用 signal_index.py rebuild 重建）
+    if new_results:
+        try:
+            signal_index.record_outcomes(new_results)
+        except Exception as e:
+            print(f"⚠️  信号索引更新失败: {e}")
+
     # 输出最新统计
     print("\n" + "=" * 60)
     print("回测结果汇总（累计）")
@@ -298,6 +385,10 @@ def run_incremental_backtest():
         print(f"💰 平均收益率: {avg_return:+.2f}%")
         print(f"💰 累积总收益: {cumulative['total_return']:+.2f}%")
         print(f"📅 覆盖天数: {len(processed_dates)}")
+        print_group_stats("🧩 按研判方式统计（json/regex: Gemini，local: 本地词典评分）", cumulative.get("method_stats"))
+        print_group_stats("🏭 按板块统计", cumulative.get("sector_stats"))
+        if len(cumulative.get("universe_stats", {})) > 1:
+            print_group_stats("🌐 按 universe 统计", cumulative["universe_stats"])
 
     print("=" * 60)
 
@@ -314,11 +405,29 @@ def run_incremental_backtest():
         print("-" * 100)
 
 if __name__ == "__main__":
-    print("\n📊 日股预测回测系统（增量模式）\n")
+    parser = argparse.ArgumentParser(description="日股预测回测（增量模式）")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILE_MODES,
+                        help="按阶段剖析性能，结果写入 report_YYYYMMDD/profile/backtest/")
+    args = parser.parse_args()
 
-    # 运行增量回测
-    run_incremental_backtest()
+    print("\n📊 日股预测回测系统（增量模式）\n")
+    profiler = StageProfiler(f"report_{datetime.now().strftime('%Y%m%d')}", mode=args.profile, label="backtest")
 
-    # 清理旧文件
-    print("\n🗑️  检查是否有旧文件需要清理...")
-    clean_old_files()
+    try:
+        with single_instance("backtest"):
+            # 运行增量回测
+            with profiler.stage("backtest"):
+                run_incremental_backtest()
+
+            # 清理旧文件
+            print("\n🗑️  检查是否有旧文件需要清理...")
+            with profiler.stage("clean"):
+                clean_old_files()
+    except AlreadyRunningError as e:
+        print(f"⏳ {e}，本次回测退出")
+    except StorageError as e:
+        print(f"❌ {e}")
+        print("   请修复或从 results 分支恢复该文件后重新运行（累计统计不会被重置）")
+        sys.exit(1)
+    finally:
+        profiler.report()
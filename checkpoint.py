@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+每日预测流程的阶段检查点
+每个阶段完成后原子写入 report_YYYYMMDD/checkpoint/<阶段>.json（storage.atomic_write_json），
+--resume 时从最后完成的阶段继续，避免重复抓取和重复调用 LLM
+
+阶段:
+    titles     抓取到的标题（及周末模式信息）
+    stage1     Gemini 初筛选中的 ID 和新闻
+    summaries  逐篇 Qwen 摘要（按 URL 记录，每篇完成后立即写入）
+    stage2     Gemini 终极研判的原始响应
+    done       报告已保存并入队发送
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+
+from storage import atomic_write_json
+
+STAGES = ["titles", "stage1", "summaries", "stage2", "done"]
+
+class RunCheckpoint:
+    """一次运行的检查点目录"""
+
+    def __init__(self, save_dir):
+        self.dir = os.path.join(save_dir, "checkpoint")
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, stage):
+        return os.path.join(self.dir, f"{stage}.json")
+
+    def load(self, stage):
+        """读取阶段数据，不存在或损坏返回 None"""
+        path = self._path(stage)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("data")
+        except (OSError, ValueError) as e:
+            print(f"⚠️  检查点 {stage} 无法读取，将重新执行该阶段: {e}")
+            return None
+
+    def save(self, stage, data):
+        """原子写入阶段数据"""
+        atomic_write_json(self._path(stage), {
+            "stage": stage,
+            "saved_at": datetime.now().isoformat(),
+            "data": data
+        })
+
+    def last_completed(self):
+        """返回最后一个已完成的阶段名（summaries 是逐篇写入的，不一定完整）"""
+        last = None
+        for stage in STAGES:
+            if os.path.exists(self._path(stage)):
+                last = stage
+        return last
+
+    def clear(self):
+        """清空检查点（非 --resume 的全新运行）"""
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.makedirs(self.dir, exist_ok=True)
@@ -28,11 +28,28 @@ class Config:
     # --- Telegram 配置 ---
     TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN', '')
     TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID', '')
+    # Bot API 地址（测试时可指向 telegram_queue.py stub 启动的本地假服务）
+    TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org')
+    # 运行结束时最多等待多少秒把队列发完，剩余消息下次运行继续发送
+    TELEGRAM_FLUSH_TIMEOUT = int(os.getenv('TELEGRAM_FLUSH_TIMEOUT', '60'))
     # --------------------------
 
     # === Gemini 配置 ===
     GEMINI_MODEL_ID = os.getenv('GEMINI_MODEL_ID', 'models/gemini-2.5-flash')
     GEMINI_TIMEOUT = int(os.getenv('GEMINI_TIMEOUT', '300'))
+    # 初筛单次 prompt 最多包含的标题数，超过时进入锦标赛模式（分块筛选、逐轮晋级）
+    STAGE1_CHUNK_SIZE = int(os.getenv('STAGE1_CHUNK_SIZE', '240'))
+    # 终极研判最多使用的摘要条数，超过时先筛选
+    STAGE2_MAX_SUMMARIES = int(os.getenv('STAGE2_MAX_SUMMARIES', '40'))
+
+    # === 多 universe 与速率预算 ===
+    # 默认运行的 universe（逗号分隔，定义见 universes.json）
+    UNIVERSES = [u.strip() for u in os.getenv('UNIVERSES', 'tse').split(',') if u.strip()]
+    # 同时运行的 universe 数（1 为依次运行）
+    UNIVERSE_WORKERS = int(os.getenv('UNIVERSE_WORKERS', '1'))
+    # 所有 universe 共用的 LLM 调用预算（每分钟次数）
+    GEMINI_RPM = int(os.getenv('GEMINI_RPM', '10'))
+    QWEN_RPM = int(os.getenv('QWEN_RPM', '40'))
 
     # === 可选配置 ===
     DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
@@ -84,8 +101,16 @@ class Config:
             print(f"TELEGRAM_TOKEN: {'*' * 20 if cls.TELEGRAM_TOKEN else '未设置'}")
 
         print(f"TELEGRAM_CHAT_ID: {cls.TELEGRAM_CHAT_ID}")
+        print(f"TELEGRAM_API_BASE: {cls.TELEGRAM_API_BASE}")
+        print(f"TELEGRAM_FLUSH_TIMEOUT: {cls.TELEGRAM_FLUSH_TIMEOUT}秒")
         print(f"GEMINI_MODEL_ID: {cls.GEMINI_MODEL_ID}")
         print(f"GEMINI_TIMEOUT: {cls.GEMINI_TIMEOUT}秒")
+        print(f"STAGE1_CHUNK_SIZE: {cls.STAGE1_CHUNK_SIZE}")
+        print(f"STAGE2_MAX_SUMMARIES: {cls.STAGE2_MAX_SUMMARIES}")
+        print(f"UNIVERSES: {','.join(cls.UNIVERSES)}")
+        print(f"UNIVERSE_WORKERS: {cls.UNIVERSE_WORKERS}")
+        print(f"GEMINI_RPM: {cls.GEMINI_RPM}")
+        print(f"QWEN_RPM: {cls.QWEN_RPM}")
         print(f"DEBUG: {cls.DEBUG}")
         print(f"LOG_LEVEL: {cls.LOG_LEVEL}")
         print(f"PREDICTION_RETENTION_DAYS: {cls.PREDICTION_RETENTION_DAYS}天")
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+本地词典评分（Gemini 终极研判不可用时的备用研判）
+- 只用 CPU：对 Qwen 摘要做一次词频统计，情绪 / 题材 / 宏观驱动 / 个股提及全部是矩阵乘法（NumPy）
+- 题材和个股通过关键词 → 股票代码表映射，输出与 Gemini 结构化研判相同的 JSON
+  （macro_logic / sector_view / picks / risk），后续走同一套校验、渲染和保存流程
+- 预测文件中 extraction.method 记为 "local"，回测单独统计其正确率
+
+命令行:
+    python3 local_ranker.py predictions/prediction_2026-02-05.json   # 用历史摘要试跑并计时
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+# 情绪词：权重 > 0 偏多，< 0 偏空（摘要多为中文，标题为日文，两种都收录）
+SENTIMENT_TERMS = {
+    "上涨": 1.0, "大涨": 1.5, "飙升": 1.5, "创新高": 1.5, "上调": 1.0, "增长": 0.8, "增收": 0.8,
+    "超预期": 1.5, "利好": 1.2, "回购": 1.0, "增持": 1.0, "扭亏": 1.2, "强劲": 0.8, "复苏": 0.8,
+    "上昇": 1.0, "急騰": 1.5, "最高値": 1.5, "最高益": 1.5, "上方修正": 1.5, "増益": 1.0,
+    "増配": 1.0, "自社株買い": 1.0, "好調": 1.0, "黒字": 0.8,
+    "下跌": -1.0, "大跌": -1.5, "暴跌": -1.5, "下调": -1.0, "下滑": -0.8, "减少": -0.6,
+    "低于预期": -1.5, "不及预期": -1.5, "利空": -1.2, "亏损": -1.2, "减持": -1.0, "疲软": -0.8,
+    "下落": -1.0, "急落": -1.5, "下方修正": -1.5, "減益": -1.0, "減配": -1.0, "赤字": -1.2,
+    "不振": -1.0, "懸念": -0.6,
+}
+
+# 题材：(名称, 关键词, 代表个股)，个股按代表性排序
+THEMES = [
+    ("半导体", ("半导体", "芯片", "晶圆", "英伟达", "半導体", "エヌビディア", "NVIDIA"),
+     ("8035.T", "6857.T", "6920.T", "6146.T")),
+    ("汽车", ("汽车", "车企", "电动车", "自動車"), ("7203.T", "7267.T", "6902.T")),
+    ("银行", ("银行", "利差", "銀行", "メガバンク"), ("8306.T", "8316.T", "8411.T")),
+    ("商社/资源", ("商社", "原油", "油价", "铜价", "资源", "資源", "原油価格"), ("8058.T", "8031.T", "1605.T")),
+    ("游戏/娱乐", ("游戏", "动漫", "ゲーム", "アニメ"), ("7974.T", "6758.T", "9697.T")),
+    ("海运", ("海运", "运费", "集装箱", "海運"), ("9101.T", "9104.T", "9107.T")),
+    ("航空/旅游", ("航空", "访日", "入境游", "インバウンド", "訪日"), ("9201.T", "9202.T", "4661.T")),
+    ("房地产", ("房地产", "楼市", "地产", "不動産"), ("8801.T", "8802.T", "8830.T")),
+    ("医药", ("制药", "新药", "医药", "製薬", "医薬"), ("4568.T", "4502.T", "4519.T")),
+    ("国防/重工", ("国防", "防卫", "军工", "防衛", "軍事"), ("7011.T", "7012.T", "7013.T")),
+    ("零售/消费", ("零售", "消费", "小売", "消費"), ("9983.T", "3382.T", "8267.T")),
+    ("通信/AI投资", ("软银", "数据中心", "ソフトバンク", "データセンター"), ("9984.T", "9432.T", "9433.T")),
+]
+
+# 宏观驱动：出现即对相关题材加减分（不依赖同一摘要中的情绪词）
+MACRO_DRIVERS = {
+    "日元贬值": {"汽车": 1.0, "游戏/娱乐": 0.5, "航空/旅游": -0.5},
+    "日元走弱": {"汽车": 1.0, "游戏/娱乐": 0.5, "航空/旅游": -0.5},
+    "円安": {"汽车": 1.0, "游戏/娱乐": 0.5, "航空/旅游": -0.5},
+    "日元升值": {"汽车": -1.0, "游戏/娱乐": -0.5, "航空/旅游": 0.5},
+    "日元走强": {"汽车": -1.0, "游戏/娱乐": -0.5, "航空/旅游": 0.5},
+    "円高": {"汽车": -1.0, "游戏/娱乐": -0.5, "航空/旅游": 0.5},
+    "加息": {"银行": 1.0, "房地产": -1.0},
+    "利上げ": {"银行": 1.0, "房地产": -1.0},
+    "降息": {"银行": -1.0, "房地产": 1.0},
+    "利下げ": {"银行": -1.0, "房地产": 1.0},
+    "油价上涨": {"商社/资源": 1.0, "航空/旅游": -1.0},
+    "原油高": {"商社/资源": 1.0, "航空/旅游": -1.0},
+    "油价下跌": {"商社/资源": -1.0, "航空/旅游": 1.0},
+    "原油安": {"商社/资源": -1.0, "航空/旅游": 1.0},
+    "关税": {"汽车": -1.0},
+    "関税": {"汽车": -1.0},
+}
+
+# 个股别名（中文摘要里常见的公司简称）→ 股票代码
+TICKER_ALIASES = {
+    "东京电子": "8035.T", "東京エレクトロン": "8035.T", "爱德万": "6857.T", "アドバンテスト": "6857.T",
+    "Lasertec": "6920.T", "レーザーテック": "6920.T", "迪斯科": "6146.T", "ディスコ": "6146.T",
+    "丰田": "7203.T", "トヨタ": "7203.T", "本田": "7267.T", "ホンダ": "7267.T", "日产": "7201.T",
+    "日産": "7201.T", "电装": "6902.T", "デンソー": "6902.T",
+    "三菱日联": "8306.T", "三菱UFJ": "8306.T", "三井住友": "8316.T", "瑞穗": "8411.T", "みずほ": "8411.T",
+    "三菱商事": "8058.T", "三井物产": "8031.T", "三井物産": "8031.T", "伊藤忠": "8001.T",
+    "任天堂": "7974.T", "索尼": "6758.T", "ソニー": "6758.T", "卡普空": "9697.T", "カプコン": "9697.T",
+    "日本邮船": "9101.T", "日本郵船": "9101.T", "商船三井": "9104.T",
+    "日本航空": "9201.T", "全日空": "9202.T", "东方乐园": "4661.T",
+    "第一三共": "4568.T", "武田": "4502.T", "中外制药": "4519.T", "中外製薬": "4519.T",
+    "三菱重工": "7011.T", "川崎重工": "7012.T",
+    "迅销": "9983.T", "优衣库": "9983.T", "ユニクロ": "9983.T", "ファーストリテイリング": "9983.T",
+    "软银集团": "9984.T", "ソフトバンクグループ": "9984.T", "日立": "6501.T", "基恩士": "6861.T",
+    "キーエンス": "6861.T", "发那科": "6954.T", "ファナック": "6954.T",
+}
+
+# 直接提及个股的情绪比题材映射更可靠
+DIRECT_MENTION_WEIGHT = 1.5
+# 题材内排序靠后的代表股分数递减
+THEME_RANK_DECAY = 0.8
+# 词典模型的置信度上限（低于 LLM 研判的常见取值）
+MAX_CONFIDENCE = 0.6
+
+def _build_model():
+    """把各张词表合并成一个词汇表，并构造从词频到各项得分的投影矩阵"""
+    theme_names = [name for name, _, _ in THEMES]
+    tickers = sorted({t for _, _, codes in THEMES for t in codes} | set(TICKER_ALIASES.values()))
+    vocab = sorted(set(SENTIMENT_TERMS) | {k for _, kws, _ in THEMES for k in kws}
+                   | set(MACRO_DRIVERS) | set(TICKER_ALIASES))
+    index = {term: i for i, term in enumerate(vocab)}
+    theme_index = {name: g for g, name in enumerate(theme_names)}
+    ticker_index = {code: u for u, code in enumerate(tickers)}
+
+    sentiment = np.zeros(len(vocab))
+    for term, weight in SENTIMENT_TERMS.items():
+        sentiment[index[term]] = weight
+
+    theme_member = np.zeros((len(vocab), len(theme_names)))
+    theme_to_ticker = np.zeros((len(theme_names), len(tickers)))
+    for g, (_, keywords, codes) in enumerate(THEMES):
+        for kw in keywords:
+            theme_member[index[kw], g] = 1.0
+        for rank, code in enumerate(codes):
+            theme_to_ticker[g, ticker_index[code]] = THEME_RANK_DECAY ** rank
+
+    drivers = np.zeros((len(vocab), len(theme_names)))
+    for term, effects in MACRO_DRIVERS.items():
+        for name, weight in effects.items():
+            drivers[index[term], theme_index[name]] = weight
+
+    aliases = np.zeros((len(vocab), len(tickers)))
+    for alias, code in TICKER_ALIASES.items():
+        aliases[index[alias], ticker_index[code]] = 1.0
+
+    ticker_theme = {}
+    for name, _, codes in THEMES:
+        for code in codes:
+            ticker_theme.setdefault(code, name)
+
+    return {
+        "vocab": vocab, "theme_names": theme_names, "tickers": tickers, "ticker_theme": ticker_theme,
+        "sentiment": sentiment, "theme_member": theme_member, "theme_to_ticker": theme_to_ticker,
+        "drivers": drivers, "aliases": aliases,
+    }
+
+MODEL = _build_model()
+
+def term_counts(texts, vocab=None):
+    """词频矩阵 (新闻数 × 词汇数)"""
+    vocab = vocab or MODEL["vocab"]
+    return np.array([[text.count(term) for term in vocab] for text in texts], dtype=float).reshape(
+        len(texts), len(vocab))
+
+def score_summaries(summaries):
+    """
+    对摘要打分
+    返回: (各题材得分, 各个股得分, 每条新闻的情绪)
+    """
+    texts = [f"{s.get('title', '')} {s.get('summary', '')}" for s in summaries]
+    counts = term_counts(texts)
+
+    # 每条新闻的情绪压缩到 (-1, 1)，避免一条长新闻主导结果
+    sentiment = np.tanh(counts @ MODEL["sentiment"] / 2)
+    theme_hits = (counts @ MODEL["theme_member"]) > 0
+    ticker_hits = (counts @ MODEL["aliases"]) > 0
+
+    theme_scores = sentiment @ theme_hits + (counts @ MODEL["drivers"]).sum(axis=0)
+    ticker_scores = theme_scores @ MODEL["theme_to_ticker"] + DIRECT_MENTION_WEIGHT * (sentiment @ ticker_hits)
+    # 按新闻条数的平方根缩放，使全量研判和增量研判的分数可比
+    scale = np.sqrt(max(len(texts), 1))
+    return theme_scores / scale, ticker_scores / scale, sentiment
+
+def confidence_from_score(score):
+    return round(float(np.tanh(abs(score) / 4)) * MAX_CONFIDENCE, 2)
+
+def local_rank(summaries, top_n=3):
+    """
+    用词典模型生成研判结果，结构与 Gemini 结构化输出（STAGE2_RESPONSE_SCHEMA）相同
+    没有任何题材/个股信号时 picks 为空
+    """
+    theme_scores, ticker_scores, sentiment = score_summaries(summaries)
+
+    theme_order = np.argsort(-np.abs(theme_scores))
+    macro_logic = [
+        f"{MODEL['theme_names'][g]}：新闻信号得分 {theme_scores[g]:+.2f}（{'偏多' if theme_scores[g] > 0 else '偏空'}）"
+        for g in theme_order[:3] if theme_scores[g] != 0
+    ]
+    if not macro_logic:
+        macro_logic = [f"新闻整体情绪 {sentiment.mean() if len(sentiment) else 0:+.2f}，未识别到明确的板块信号"]
+
+    picks = []
+    for u in np.argsort(-np.abs(ticker_scores))[:top_n]:
+        score = ticker_scores[u]
+        if score == 0:
+            break
+        code = MODEL["tickers"][u]
+        theme = MODEL["ticker_theme"].get(code, "个股新闻")
+        picks.append({
+            "ticker": code,
+            "name": "",
+            "direction": "看涨" if score > 0 else "看跌",
+            "confidence": confidence_from_score(score),
+            "reason": f"{theme}相关新闻的词典评分 {score:+.2f}"
+        })
+
+    sector_view = "，".join(
+        f"{MODEL['theme_names'][g]}{'看多' if theme_scores[g] > 0 else '看空'}"
+        for g in theme_order[:3] if theme_scores[g] != 0) or "无明确板块倾向"
+
+    return {
+        "macro_logic": macro_logic,
+        "sector_view": sector_view,
+        "picks": picks,
+        "risk": "Gemini 研判不可用，本结果由本地词典评分生成，只反映新闻措辞的多空倾向，仅供参考"
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        pred_data = json.load(f)
+    summaries = pred_data.get("summaries") or []
+    if not summaries:
+        print("⚠️  预测文件中没有摘要（summaries 字段）")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    result = local_rank(summaries)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(f"\n⏱️  {len(summaries)} 条摘要，评分耗时 {elapsed_ms:.2f} ms")
@@ -1,14 +1,30 @@
+import argparse
 import requests
 from bs4 import BeautifulSoup
 import json
 import time
 import os
 import re
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 import sys
 
 # 加载配置
 from config import Config
+from checkpoint import RunCheckpoint
+from storage import (atomic_write_json, atomic_write_text, append_lines, file_lock, load_json, remove_path,
+                     single_instance, AlreadyRunningError, CorruptFileError)
+from local_ranker import local_rank
+from rate_limit import RateLimiter
+from universes import DEFAULT_FEED, get_universe, get_universes, is_default, universe_path, prediction_path
+from trading_calendar import is_trading_day, next_trading_day, previous_trading_day, session_has_closed
+import telegram_queue
+import signal_index
+from profiling import StageProfiler, PROFILE_MODES
+from tse_tickers import (normalize_ticker, get_ticker_master, is_known_ticker,
+                         is_possible_ticker, enrich_prediction, TICKER_CODE)
 
 # 验证配置
 if not Config.validate():
@@ -20,74 +36,120 @@ QWEN_API_KEY = Config.QWEN_API_KEY
 GEMINI_API_KEY = Config.GEMINI_API_KEY
 MODEL_ID = Config.GEMINI_MODEL_ID
 
-def get_save_dir():
-    folder = f"report_{datetime.now().strftime('%Y%m%d')}"
-    if not os.path.exists(folder):
-        os.makedirs(folder)
+# 同一进程中所有 universe 共用的 HTTP 连接池和 LLM 调用预算
+HTTP = requests.Session()
+HTTP.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16))
+GEMINI_LIMITER = RateLimiter(Config.GEMINI_RPM, "Gemini")
+QWEN_LIMITER = RateLimiter(Config.QWEN_RPM, "Qwen")
+
+# 进程内缓存：同一新闻源只抓取一次，同一篇文章只摘要一次
+# 值为 Future，并行的 universe 等待第一次抓取/摘要的结果，不重复请求
+_feed_cache = {}
+_summary_cache = {}
+_cache_lock = threading.Lock()
+
+def shared_result(cache, key, compute, keep=None):
+    """
+    同一 key 只由第一个线程调用 compute，其他线程等待其结果
+    keep(结果) 为假时（如摘要失败）不保留在缓存中，之后的调用重新计算
+    返回 (结果, 是否复用)
+    """
+    with _cache_lock:
+        future = cache.get(key)
+        reused = future is not None
+        if not reused:
+            future = cache[key] = Future()
+    if reused:
+        return future.result(), True
+
+    try:
+        result = compute()
+    except BaseException as e:
+        with _cache_lock:
+            del cache[key]
+        future.set_exception(e)
+        raise
+    if keep is not None and not keep(result):
+        with _cache_lock:
+            del cache[key]
+    future.set_result(result)
+    return result, False
+
+def get_save_dir(universe=None):
+    """当天的报告目录（非默认 universe 为其中以 universe 名命名的子目录）"""
+    folder = universe_path(f"report_{datetime.now().strftime('%Y%m%d')}", universe and universe.name)
+    os.makedirs(folder, exist_ok=True)
     return folder
 
-def is_weekend():
-    """判断是否应该启用周末模式（累积新闻而不是立即处理）"""
-    weekday = datetime.now().weekday()
-    hour = datetime.now().hour
+def is_weekend(now=None, incremental=False):
+    """
+    判断是否应该启用周末/休市模式（累积新闻而不是立即处理）
+    按东证交易日历判断，节假日和年末年初与周末同样处理
+    incremental=True（盘前增量更新）时，交易日收盘前不累积，新闻用于当天的预测
+    """
+    now = now or datetime.now()
+    today = now.date()
 
-    # 周六、周日全天是周末模式
-    if weekday in [5, 6]:
+    # 休市日（周六、周日、节假日、年末年初）全天是周末模式
+    if not is_trading_day(today):
         return True
 
-    # 周五只有 06:00 之后才是周末模式
-    # 周五凌晨 00:05 还是工作日模式（处理周四新闻，预测周五股市）
-    if weekday == 4 and hour >= 6:
-        return True
+    # 交易日 06:00 之后，如果下一个交易日不是明天（如周五、节假日前一天），开始累积
+    # 凌晨 00:05 还是工作日模式（处理前一天新闻，预测当天股市）
+    if now.hour >= 6 and next_trading_day(today) != today + timedelta(days=1):
+        return not incremental or session_has_closed(today, now)
 
-    # 周一凌晨 0-3 点是周末模式（处理周末累积的新闻）
-    if weekday == 0 and hour < 3:
+    # 休市后第一个交易日凌晨 0-3 点是周末模式（处理累积的新闻）
+    if now.hour < 3 and not is_trading_day(today - timedelta(days=1)):
         return True
 
     return False
 
 def get_next_trading_day(from_date=None):
-    """获取下一个交易日"""
+    """获取下一个交易日（跳过周末和东证休市日）"""
     if from_date is None:
-        today = datetime.now()
-    else:
-        today = from_date
+        from_date = datetime.now()
+    return next_trading_day(from_date).strftime('%Y-%m-%d')
 
-    next_day = today + timedelta(days=1)
-    # 跳过周末
-    while next_day.weekday() >= 5:
-        next_day += timedelta(days=1)
-    return next_day.strftime('%Y-%m-%d')
+def get_target_trading_day(now=None):
+    """
+    获取本次预测针对的交易日：
+    当天是交易日且尚未收盘时为当天（凌晨运行预测当天股市），否则为下一个交易日
+    """
+    now = now or datetime.now()
+    if is_trading_day(now.date()) and not session_has_closed(now.date(), now):
+        return now.strftime('%Y-%m-%d')
+    return get_next_trading_day(now)
 
-def get_weekend_cache_file():
+def get_weekend_cache_file(now=None, universe=None):
     """获取周末缓存文件路径"""
-    cache_dir = "./weekend_cache"
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
-
-    # 找到本周五的日期作为标识
-    today = datetime.now()
-    # 计算距离上一个或当前周五的天数
-    days_since_friday = (today.weekday() - 4) % 7
-    this_friday = today - timedelta(days=days_since_friday)
+    cache_dir = universe_path("./weekend_cache", universe and universe.name)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # 以休市前最后一个交易日（通常是周五）的日期作为标识
+    now = now or datetime.now()
+    today = now.date()
+    if is_trading_day(today) and now.hour >= 3:
+        last_session = today
+    else:
+        last_session = previous_trading_day(today)
 
-    return f"{cache_dir}/weekend_{this_friday.strftime('%Y%m%d')}.json"
+    return f"{cache_dir}/weekend_{last_session.strftime('%Y%m%d')}.jsonl"
 
 # 1. 抓取模块
-def fetch_80_titles():
+def fetch_80_titles(url=DEFAULT_FEED):
     now = datetime.now()
     target_dt = now - timedelta(days=1) if now.hour < 3 else now
     target_date_short = target_dt.strftime('%-m/%-d')
 
     print(f"🎯 正在检索日期为 {target_date_short} 的新闻标题...")
 
-    url = "https://finance.yahoo.co.jp/news/bus_all"
     headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"}
 
     titles_pool = []
     for page in range(1, 6):
         try:
-            res = requests.get(f"{url}?page={page}", headers=headers, timeout=30)
+            res = HTTP.get(f"{url}?page={page}", headers=headers, timeout=30)
             soup = BeautifulSoup(res.text, 'html.parser')
             news_items = soup.select('a[href*="/news/detail/"]')
             for a in news_items:
@@ -107,30 +169,110 @@ def fetch_80_titles():
         except: break
     return titles_pool[:80]
 
+def fetch_universe_titles(universe=None):
+    """抓取 universe 的全部新闻源（同一进程内每个新闻源只抓取一次），按 URL 去重"""
+    universe = universe or get_universe()
+    titles, seen = [], set()
+    for feed in universe.feeds:
+        feed_titles, reused = shared_result(_feed_cache, feed, lambda: fetch_80_titles(feed))
+        if reused:
+            print(f"♻️  复用已抓取的新闻源: {feed}")
+        for t in feed_titles:
+            if t['url'] not in seen:
+                seen.add(t['url'])
+                titles.append(t)
+    return titles
+
 # 2. Gemini 初筛
+class GeminiStage1Error(Exception):
+    """Gemini 初筛请求失败（非 200 响应或请求异常），由调用方决定中止还是降级"""
+
 def gemini_stage1_filter(titles_list, target_count=20):
+    """初筛，返回选中的新闻条目"""
+    return [titles_list[i] for i in gemini_stage1_select_ids(titles_list, target_count)]
+
+def gemini_stage1_select_ids(titles_list, target_count=20, with_summary=False, focus=""):
+    """
+    初筛，返回选中新闻在 titles_list 中的 ID（去重、保持顺序）
+    with_summary=True 时把摘要一并交给模型（用于从摘要中再筛选）
+    focus 为 universe 的关注方向（空为全市场）
+    请求失败时抛出 GeminiStage1Error
+    """
     print(f"⚡️ Gemini 2.5 Flash 正在高速初筛...")
     url = f"https://generativelanguage.googleapis.com/v1beta/{MODEL_ID}:generateContent?key={GEMINI_API_KEY}"
-    context = "\n".join([f"ID {i}: {t['title']}" for i, t in enumerate(titles_list)])
-    prompt = f"你是操盘手。从以下标题中选出影响明日股市的 {target_count} 条，只返回 ID 列表 [1, 2, 3]：\n{context}"
+    focus_hint = f"与「{focus}」相关、" if focus else ""
+    if with_summary:
+        context = "\n".join([f"ID {i}: {t['title']}｜{t['summary']}" for i, t in enumerate(titles_list)])
+        prompt = f"你是操盘手。从以下新闻摘要中选出{focus_hint}影响明日股市的 {target_count} 条，只返回 ID 列表 [1, 2, 3]：\n{context}"
+    else:
+        context = "\n".join([f"ID {i}: {t['title']}" for i, t in enumerate(titles_list)])
+        prompt = f"你是操盘手。从以下标题中选出{focus_hint}影响明日股市的 {target_count} 条，只返回 ID 列表 [1, 2, 3]：\n{context}"
 
     try:
-        res = requests.post(url, json={"contents": [{"parts": [{"text": prompt}]}]}, timeout=300)
+        GEMINI_LIMITER.acquire()
+        res = HTTP.post(url, json={"contents": [{"parts": [{"text": prompt}]}]}, timeout=300)
         if res.status_code != 200:
-            print(f"❌ Gemini 初筛请求失败，状态码: {res.status_code}")
-            sys.exit(1)
+            raise GeminiStage1Error(f"Gemini 初筛请求失败，状态码: {res.status_code}")
 
         raw_text = res.json()['candidates'][0]['content']['parts'][0]['text']
         ids = [int(i) for i in re.findall(r'\d+', raw_text)]
-        return [titles_list[i] for i in ids if i < len(titles_list)][:target_count]
+        return list(dict.fromkeys(i for i in ids if i < len(titles_list)))[:target_count]
+    except GeminiStage1Error:
+        raise
     except Exception as e:
-        print(f"❌ 初筛异常: {e}")
-        sys.exit(1)
+        raise GeminiStage1Error(f"初筛异常: {e}") from e
+
+def gemini_stage1_tournament(items, target_count=20, chunk_size=None, with_summary=False, focus=""):
+    """
+    流式锦标赛初筛：逐条读入 items（可以是生成器），每满 chunk_size 条
+    交给 Gemini 选出 target_count 条晋级下一轮，晋级者再按块比较，直到剩下 target_count 条
+    内存中只保留各轮未满一块的候选，单次 prompt 不超过 chunk_size 条，与输入总量无关
+    返回 [(全局ID, 条目), ...]
+    """
+    chunk_size = max(chunk_size or Config.STAGE1_CHUNK_SIZE, target_count * 2)
+    rounds = []  # rounds[r]: 等待第 r 轮比较的候选 [(全局ID, 条目)]
+    calls = 0
+
+    def select(batch, count):
+        nonlocal calls
+        calls += 1
+        ids = gemini_stage1_select_ids([item for _, item in batch], count, with_summary, focus)
+        return [batch[i] for i in ids]
+
+    def promote(level, candidates):
+        while candidates:
+            if len(rounds) <= level:
+                rounds.append([])
+            rounds[level].extend(candidates)
+            candidates = []
+            if len(rounds[level]) >= chunk_size:
+                batch, rounds[level] = rounds[level][:chunk_size], rounds[level][chunk_size:]
+                candidates = select(batch, target_count)
+                level += 1
+
+    total = 0
+    for idx, item in enumerate(items):
+        promote(0, [(idx, item)])
+        total += 1
+
+    # 收尾：从低轮到高轮合并剩余候选，超过一块时继续淘汰
+    pool = []
+    for leftovers in rounds:
+        pool.extend(leftovers)
+        while len(pool) > chunk_size:
+            batch, pool = pool[:chunk_size], pool[chunk_size:]
+            pool = select(batch, target_count) + pool
+    if len(pool) > target_count:
+        pool = select(pool, target_count)
+
+    if calls > 1:
+        print(f"🏟️  锦标赛初筛：{total} 条 → {len(pool)} 条，{len(rounds)} 轮，共 {calls} 次调用（每块 ≤{chunk_size} 条）")
+    return pool
 
 # 3. 爬正文：支持长文本抓取
 def fetch_content(url):
     try:
-        res = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
+        res = HTTP.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
         soup = BeautifulSoup(res.text, 'html.parser')
 
         # 智能查找有效段落（过滤JavaScript、登录等无关内容）
@@ -182,8 +324,9 @@ def qwen_summarize(title, content, max_retries=3):
 
     for attempt in range(max_retries):
         try:
-            res = requests.post("https://api.siliconflow.cn/v1/chat/completions",
-                              json=payload, headers=headers, timeout=300)
+            QWEN_LIMITER.acquire()
+            res = HTTP.post("https://api.siliconflow.cn/v1/chat/completions",
+                            json=payload, headers=headers, timeout=300)
             if res.status_code == 200:
                 return res.json()['choices'][0]['message']['content']
             else:
@@ -196,10 +339,44 @@ def qwen_summarize(title, content, max_retries=3):
     return f"摘要生成失败: {title}"
 
 # 5. Gemini 终极研判
-def gemini_stage2_rank(summaries, target_date, max_retries=3):
+# 结构化输出的 JSON Schema（Gemini responseSchema，OpenAPI 子集）
+STAGE2_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "macro_logic": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "sector_view": {"type": "STRING"},
+        "picks": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "ticker": {"type": "STRING"},
+                    "name": {"type": "STRING"},
+                    "direction": {"type": "STRING", "enum": ["看涨", "看跌"]},
+                    "confidence": {"type": "NUMBER"},
+                    "reason": {"type": "STRING"}
+                },
+                "required": ["ticker", "name", "direction", "confidence", "reason"],
+                "propertyOrdering": ["ticker", "name", "direction", "confidence", "reason"]
+            }
+        },
+        "risk": {"type": "STRING"}
+    },
+    "required": ["macro_logic", "sector_view", "picks", "risk"],
+    "propertyOrdering": ["macro_logic", "sector_view", "picks", "risk"]
+}
+
+def gemini_stage2_rank(summaries, target_date, max_retries=3, structured=True, focus=""):
+    """
+    终极研判
+    structured=True 时要求 Gemini 按 STAGE2_RESPONSE_SCHEMA 返回 JSON，
+    否则返回旧版自由文本（由 extract_prediction 正则解析）
+    focus 为 universe 的关注方向（空为全市场）
+    全部重试失败时返回 None（由调用方改用本地词典评分）
+    """
     print("🏆 Gemini 终极研判...")
     # 利用 Gemini 2.5 Flash 的超大上下文容量进行全量分析
-    prompt = f"""以下是全量财经新闻汇总：
+    task = f"""以下是全量财经新闻汇总：
 
 {json.dumps(summaries, ensure_ascii=False)}
 
@@ -210,11 +387,31 @@ def gemini_stage2_rank(summaries, target_date, max_retries=3):
 个股狙击：基于以上逻辑，推导下一个交易日（{target_date}）最可能受益的推荐日本个股股票。
 
 **重要要求**：
-1. 必须是真实存在的、在东京证券交易所上市的大型股票（格式如4位数字.T，必须是正确的日股代码）
-2. 给出准确的Yahoo Finance股票代码格式（4位数字.T）
+1. 必须是真实存在的、在东京证券交易所上市的大型股票（格式如 8035.T、285A.T，必须是正确的日股代码）
+2. 给出准确的Yahoo Finance股票代码格式（4位证券代码.T）
 3. 给出具体推导逻辑
 
-涨跌预测：请预测对应个股在下一个交易日的表现，**必须明确说明是"看涨"还是"看跌"**。
+涨跌预测：请预测对应个股在下一个交易日的表现，**必须明确说明是"看涨"还是"看跌"**。"""
+    if focus:
+        task += f"\n\n本次研判聚焦「{focus}」：宏观逻辑和个股都应围绕这一方向选择。"
+
+    if structured:
+        prompt = task + """
+
+输出要求（JSON）：
+- macro_logic: 3 条宏观逻辑
+- sector_view: 板块预测及理由
+- picks: 核心个股列表（1~3只），每只包含 ticker（4位证券代码.T，如 8035.T、285A.T）、name（公司名称）、direction（看涨/看跌）、confidence（0~1 的置信度）、reason（理由）
+- risk: 风险提示"""
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "responseMimeType": "application/json",
+                "responseSchema": STAGE2_RESPONSE_SCHEMA
+            }
+        }
+    else:
+        prompt = task + """
 
 输出格式（严格按照此格式）：
 
@@ -222,21 +419,27 @@ def gemini_stage2_rank(summaries, target_date, max_retries=3):
 
 板块预测： 板块 A看多，理由...
 
-核心个股： [股票代码，如4位数字.T]
+核心个股： [股票代码，如 8035.T]
 股票名称： [公司名称]
 预测方向： 看涨/看跌
 理由： ...
 
 风险提示： ..."""
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
 
     url = f"https://generativelanguage.googleapis.com/v1beta/{MODEL_ID}:generateContent?key={GEMINI_API_KEY}"
 
     for attempt in range(max_retries):
         try:
             # 增加timeout到300秒（5分钟），足够处理240条新闻
-            res = requests.post(url, json={"contents": [{"parts": [{"text": prompt}]}]}, timeout=300)
+            GEMINI_LIMITER.acquire()
+            res = HTTP.post(url, json=payload, timeout=300)
             if res.status_code == 200:
                 return res.json()['candidates'][0]['content']['parts'][0]['text']
+            elif res.status_code == 400 and structured:
+                # 模型不支持 responseSchema 时退回自由文本模式
+                print("  ⚠️  Gemini 不接受结构化输出请求，改用文本模式")
+                return gemini_stage2_rank(summaries, target_date, max_retries, structured=False, focus=focus)
             else:
                 print(f"  ⚠️  Gemini API 返回错误: {res.status_code}, 重试 {attempt+1}/{max_retries}")
                 time.sleep(3)
@@ -245,7 +448,102 @@ def gemini_stage2_rank(summaries, target_date, max_retries=3):
             time.sleep(3)
 
     print("❌ Gemini 终极研判失败")
-    sys.exit(1)
+    return None
+
+def validate_picks(picks):
+    """
+    校验结构化输出中的个股：代码格式、主表存在性、方向
+    返回与 extract_prediction 相同结构的列表元素
+    """
+    predictions = []
+    seen = set()
+    for pick in picks or []:
+        if not isinstance(pick, dict):
+            continue
+        code = normalize_ticker(pick.get("ticker"))
+        direction = str(pick.get("direction", "")).replace('漲', '涨')
+        if not code or direction not in ("看涨", "看跌"):
+            print(f"  ⚠️  丢弃无效个股: {pick.get('ticker')} {pick.get('direction')}")
+            continue
+        if code in seen:
+            continue
+        seen.add(code)
+
+        if not is_possible_ticker(code):
+            print(f"  ⚠️  丢弃不存在的股票代码: {code}")
+            continue
+
+        item = {"stock_code": code, "direction": direction}
+        if is_known_ticker(code):
+            enrich_prediction(item)
+        else:
+            print(f"  ⚠️  {code} 不在股票主表中，保留但标记为未验证")
+            item["name"] = str(pick.get("name", "")).strip()
+            item["verified"] = False
+        try:
+            item["confidence"] = round(min(max(float(pick.get("confidence")), 0.0), 1.0), 2)
+        except (TypeError, ValueError):
+            pass
+        predictions.append(item)
+    return predictions[:3]
+
+def render_stage2_report(data, picks):
+    """
+    把结构化研判结果渲染成与旧版一致的文本报告（用于保存和 Telegram 推送）
+    picks 为 validate_picks 校验后的个股，无效个股不会出现在报告中
+    """
+    reasons = {}
+    for pick in data.get("picks") or []:
+        if isinstance(pick, dict):
+            reasons.setdefault(normalize_ticker(pick.get("ticker")), pick.get("reason", ""))
+
+    lines = ["宏观逻辑："]
+    for i, logic in enumerate(data.get("macro_logic") or [], 1):
+        lines.append(f"{i}. {logic}")
+    lines.append("")
+    lines.append(f"板块预测： {data.get('sector_view', '')}")
+    lines.append("")
+    for pick in picks:
+        lines.append(f"核心个股： {pick['stock_code']}")
+        lines.append(f"股票名称： {pick.get('name', '')}")
+        lines.append(f"预测方向： {pick['direction']}")
+        if pick.get("confidence") is not None:
+            lines.append(f"置信度： {pick['confidence']}")
+        lines.append(f"理由： {reasons.get(pick['stock_code'], '')}")
+        lines.append("")
+    lines.append(f"风险提示： {data.get('risk', '')}")
+    return "\n".join(lines)
+
+def parse_stage2_response(raw_text, source="gemini"):
+    """
+    解析终极研判结果：优先 json.loads 结构化输出，失败时回退到正则提取
+    source="local" 表示结果来自本地词典评分（同为结构化 JSON），解析方式记为 local
+    返回: (报告文本, 预测, 解析信息 {"method": "json"/"regex"/"local", "latency_ms": ...})
+    """
+    get_ticker_master()  # 预先加载主表，避免计入解析耗时
+    start = time.perf_counter()
+    data = None
+    try:
+        data = json.loads(raw_text)
+    except (TypeError, ValueError):
+        pass
+
+    if isinstance(data, dict):
+        # 结构化结果：没有有效个股（picks 为空或代码全部无效）时仍渲染报告，预测为空
+        picks = validate_picks(data.get("picks") or [])
+        report = render_stage2_report(data, picks)
+        prediction = (picks[0] if len(picks) == 1 else picks) if picks else None
+        latency_ms = round((time.perf_counter() - start) * 1000, 3)
+        return report, prediction, {"method": "local" if source == "local" else "json", "latency_ms": latency_ms}
+
+    # 回退：自由文本 + 正则提取，同样用主表过滤和补全
+    prediction = extract_prediction(raw_text)
+    if prediction:
+        items = [prediction] if isinstance(prediction, dict) else prediction
+        items = [enrich_prediction(p) for p in items if is_possible_ticker(p["stock_code"])]
+        prediction = (items[0] if len(items) == 1 else items) if items else None
+    latency_ms = round((time.perf_counter() - start) * 1000, 3)
+    return raw_text, prediction, {"method": "regex", "latency_ms": latency_ms}
 
 # 6. 提取预测信息（支持多股票）
 def extract_prediction(report_text):
@@ -272,7 +570,7 @@ def extract_prediction(report_text):
             content = sections[i + 1]
 
             # 在这个content中查找股票代码
-            stock_codes = re.findall(r'(\d{4}\.T)', content[:500])  # 只看前500字符
+            stock_codes = re.findall(rf'({TICKER_CODE}\.T)', content[:500])  # 只看前500字符
 
             # 查找预测方向（兼容简繁体）
             direction_matches = re.findall(r'(看涨|看跌|看漲)', content[:500])
@@ -288,9 +586,9 @@ def extract_prediction(report_text):
 
     # 方法2：如果方法1没找到，使用全局搜索
     if not predictions:
-        # 查找所有"预测方向"或"预测"模式
-        pattern = r'(\d{4}\.T).*?(看涨|看跌|看漲)'
-        matches = re.findall(pattern, report_text, re.DOTALL)
+        # 查找所有"预测方向"或"预测"模式（限定间隔长度，避免长报告上的回溯）
+        pattern = rf'({TICKER_CODE}\.T)[\s\S]{{0,300}}?(看涨|看跌|看漲)'
+        matches = re.findall(pattern, report_text)
 
         for match in matches[:3]:  # 最多取3个
             predictions.append({
@@ -316,208 +614,549 @@ def extract_prediction(report_text):
         return unique_predictions
 
 # 7. 保存标准化预测数据
-def save_prediction(date_str, target_date, report, prediction, news_count, is_weekend_data=False):
+def save_prediction(date_str, target_date, report, prediction, news_count, is_weekend_data=False, extraction=None,
+                    summaries=None, universe=None):
     """
     保存预测数据，格式化供回测使用
-    同一天多次运行会直接覆盖（不保留备份）
-    """
-    prediction_file = f"./predictions/prediction_{date_str}.json"
-    os.makedirs("./predictions", exist_ok=True)
-
-    # 直接保存（覆盖旧的）
-    data = {
-        "date": date_str,
-        "target_date": target_date,
-        "is_weekend": is_weekend_data,
-        "news_count": news_count,
-        "prediction": prediction,
-        "full_report": report,
-        "timestamp": datetime.now().isoformat(),
-        "version": "latest"
-    }
+    同一天多次运行时顶层字段始终是最新版本（回测只看最新预测），
+    之前的版本按顺序保留在 revisions 中
+    非默认 universe 保存在 predictions/<名称>/ 下
+    返回本次保存的版本号
+    """
+    universe = universe or get_universe()
+    prediction_file = prediction_path(date_str, universe.name)
+    os.makedirs(os.path.dirname(prediction_file), exist_ok=True)
+
+    # 读取旧版本和写入新版本在同一把锁内，避免并发运行丢失版本
+    with file_lock(prediction_file):
+        revisions = []
+        version = 1
+        try:
+            previous = load_json(prediction_file)
+        except CorruptFileError as e:
+            print(f"⚠️  {e}，本次从 v1 重新记录")
+            previous = None
+        if previous:
+            revisions = previous.get("revisions", [])
+            # 旧格式的 version 为 "latest"
+            prev_version = previous.get("version")
+            prev_version = prev_version if isinstance(prev_version, int) else len(revisions) + 1
+            revisions.append({
+                "version": prev_version,
+                "timestamp": previous.get("timestamp"),
+                "news_count": previous.get("news_count"),
+                "prediction": previous.get("prediction"),
+                "extraction": previous.get("extraction")
+            })
+            version = prev_version + 1
+
+        data = {
+            "date": date_str,
+            "universe": universe.name,
+            "target_date": target_date,
+            "is_weekend": is_weekend_data,
+            "news_count": news_count,
+            "prediction": prediction,
+            "extraction": extraction,
+            "full_report": report,
+            "summaries": summaries or [],  # 研判所用的新闻摘要（供信号索引追溯）
+            "timestamp": datetime.now().isoformat(),
+            "version": version,
+            "revisions": revisions
+        }
+
+        atomic_write_json(prediction_file, data)
 
-    with open(prediction_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"✅ 预测数据已保存: {prediction_file}（版本 v{version}）")
+    return version
 
-    print(f"✅ 预测数据已保存: {prediction_file}")
 # 8. 发送消息到 Telegram
-def send_telegram_msg(message):
-    """
-    发送消息到 Telegram，如果消息过长则自动拆分。
-    """
-    token = Config.TELEGRAM_TOKEN  # 建议加在你的 Config 类里
-    chat_id = Config.TELEGRAM_CHAT_ID
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    
-    # Telegram 单条消息上限为 4096 字符，安全起见我们按 2000 字拆分
-    max_length = 2000
-    msgs = [message[i:i + max_length] for i in range(0, len(message), max_length)]
-    
-    for i, msg in enumerate(msgs):
-        payload = {
-            "chat_id": chat_id,
-            "text": f"(第{i+1}部分)\n{msg}" if len(msgs) > 1 else msg,
-            "parse_mode": "Markdown"
-        }
-        try:
-            res = requests.post(url, json=payload, timeout=10)
-            if res.status_code != 200:
-                # 如果 Markdown 解析失败（比如报告里有特殊符号），尝试纯文本发送
-                payload.pop("parse_mode")
-                requests.post(url, json=payload, timeout=10)
-            print(f"🚀 Telegram 消息第 {i+1} 部分发送成功")
-        except Exception as e:
-            print(f"❌ TG 发送异常: {e}")
+def send_telegram_msg(markdown_header, report):
+    """
+    把报告加入 Telegram 投递队列并在后台开始发送（不阻塞主流程）
+    markdown_header 原样发送，report 正文在入队前做 Markdown 转义
+    """
+    telegram_queue.enqueue_message(markdown_header, report)
+    telegram_queue.start_sender()
 
 # 9. 周末模式：累积新闻
-def handle_weekend_mode():
-    """周末模式：累积周五/周六/周日的新闻"""
-    cache_file = get_weekend_cache_file()
-
-    # 读取现有缓存
-    if os.path.exists(cache_file):
-        with open(cache_file, "r", encoding="utf-8") as f:
-            cached_data = json.load(f)
-    else:
-        cached_data = {"titles": [], "dates": []}
-
-    # 抓取今天的80条新闻
-    today_titles = fetch_80_titles()
-    today_str = datetime.now().strftime('%Y-%m-%d')
+def iter_weekend_titles(cache_file):
+    """逐行读取周末缓存（JSON Lines）中的标题，不一次性载入内存"""
+    if not os.path.exists(cache_file):
+        return
+    with open(cache_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # 追加写入中断留下的半行，跳过
+                continue
+
+def scan_weekend_cache(cache_file):
+    """流式统计周末缓存：返回 (标题数, 已累积的日期列表, 已累积的 URL 集合)"""
+    count, dates, urls = 0, [], set()
+    for t in iter_weekend_titles(cache_file):
+        count += 1
+        urls.add(t.get("url"))
+        if t.get("date") and t["date"] not in dates:
+            dates.append(t["date"])
+    return count, dates, urls
+
+def migrate_legacy_weekend_cache(cache_file):
+    """把旧格式缓存 weekend_YYYYMMDD.json（{"titles", "dates"}）转换为 JSON Lines"""
+    legacy_file = cache_file[:-len(".jsonl")] + ".json"
+    if not os.path.exists(legacy_file) or os.path.exists(cache_file):
+        return
+    with open(legacy_file, "r", encoding="utf-8") as f:
+        legacy = json.load(f)
+    # 旧格式没有逐条日期，按每天 80 条还原
+    dates = legacy.get("dates") or [""]
+    atomic_write_text(cache_file, "".join(
+        json.dumps({**t, "date": dates[min(i // 80, len(dates) - 1)]}, ensure_ascii=False) + "\n"
+        for i, t in enumerate(legacy.get("titles", []))))
+    remove_path(legacy_file)
+    print(f"✅ 已将旧周末缓存转换为 JSON Lines: {cache_file}")
+
+def handle_weekend_mode(universe=None):
+    """
+    周末模式：累积周末及节假日（休市日）的新闻
+    缓存为 JSON Lines，每天只追加当天的标题（按 URL 去重），不重写整个文件
+    返回 (缓存文件, 是否开始处理, 标题数)
+    """
+    cache_file = get_weekend_cache_file(universe=universe)
+    migrate_legacy_weekend_cache(cache_file)
 
-    # 追加到缓存
-    if today_str not in cached_data["dates"]:
-        cached_data["titles"].extend(today_titles)
-        cached_data["dates"].append(today_str)
+    # 读取现有缓存（只统计，不载入标题）
+    count, dates, urls = scan_weekend_cache(cache_file)
 
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(cached_data, f, ensure_ascii=False, indent=2)
+    # 抓取今天的新闻（周五盘中和周六凌晨抓到的同一条新闻只保留一次）
+    today_titles = [t for t in fetch_universe_titles(universe) if t["url"] not in urls]
+    today_str = datetime.now().strftime('%Y-%m-%d')
 
-        print(f"✅ 周末模式：已累积 {len(today_titles)} 条新闻（总计 {len(cached_data['titles'])} 条）")
+    # 追加到缓存（加锁整批写入）
+    if today_str not in dates:
+        append_lines(cache_file, (json.dumps({**t, "date": today_str}, ensure_ascii=False) for t in today_titles))
+        count += len(today_titles)
+        dates.append(today_str)
 
-    # 检查是否到了周一凌晨，该处理了
-    weekday = datetime.now().weekday()
-    hour = datetime.now().hour
+        print(f"✅ 周末模式：已累积 {len(today_titles)} 条新闻（总计 {count} 条）")
 
-    # 周一凌晨0-3点，处理周末累积的新闻
-    should_process = (weekday == 0 and hour < 3)
+    # 检查是否到了休市后第一个交易日的凌晨，该处理了
+    now = datetime.now()
+    should_process = (now.hour < 3 and is_trading_day(now.date()))
 
-    if should_process and len(cached_data["titles"]) >= 160:  # 至少要有2天的新闻（周六+周日）
-        print(f"🎯 周末模式：开始处理累积的 {len(cached_data['titles'])} 条新闻...")
-        return cached_data["titles"], True, cached_data["dates"][0]
-    elif should_process and len(cached_data["titles"]) > 0:
+    if should_process and count >= 160:  # 至少要有2天的新闻（如周六+周日）
+        print(f"🎯 周末模式：开始处理累积的 {count} 条新闻...")
+        return cache_file, True, count
+    elif should_process and count > 0:
         # 如果周一了但新闻数量不够（可能周末没正常运行），也处理
-        print(f"⚠️  周末新闻数量不足（{len(cached_data['titles'])} 条），仍然进行处理...")
-        return cached_data["titles"], True, cached_data["dates"][0]
+        print(f"⚠️  周末新闻数量不足（{count} 条），仍然进行处理...")
+        return cache_file, True, count
     else:
-        print(f"⏳ 周末模式：等待更多数据... (当前 {len(cached_data['titles'])} 条，目标 ≥160)")
-        return None, False, None
+        print(f"⏳ 周末模式：等待更多数据... (当前 {count} 条，目标 ≥160)")
+        return None, False, count
+
+# 10. 当日文章记录（增量模式）
+def load_daily_articles(save_dir):
+    """
+    读取当天已见过的文章 URL 和已生成的摘要
+    格式: {"seen": {url: title}, "summaries": {url: {"title", "summary"}}}
+    """
+    path = os.path.join(save_dir, "daily_articles.json")
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  当日文章记录无法读取，重新开始记录: {e}")
+    return {"seen": {}, "summaries": {}}
+
+def save_daily_articles(save_dir, articles):
+    """原子写入当日文章记录"""
+    atomic_write_json(os.path.join(save_dir, "daily_articles.json"), articles)
+
+def incremental_target_count(new_count, full_count=80, full_target=20):
+    """增量模式下按新标题占比缩放初筛数量（至少 1 条，最多 20 条）"""
+    return max(1, min(full_target, -(-new_count * full_target // full_count)))
 
 # --- 执行主程序 ---
-if __name__ == "__main__":
-    save_dir = get_save_dir()
-    today_str = datetime.now().strftime('%Y-%m-%d')
+def load_or_fetch_titles(checkpoint, resume, articles=None, universe=None):
+    """
+    阶段1：获取标题（工作日抓取 / 周末累积）
+    articles 不为 None 时为增量模式：工作日只保留当天尚未见过的标题
+    返回 titles 检查点数据；周末模式尚未到处理时间时返回 None
+    """
+    if resume:
+        data = checkpoint.load("titles")
+        if data:
+            print(f"♻️  从检查点恢复 {data['count']} 条标题")
+            return data
 
     # 判断是否是周末模式
-    if is_weekend():
+    if is_weekend(incremental=articles is not None):
         print("📅 检测到周末日期，启用周末模式...")
-        all_titles, should_process, base_date = handle_weekend_mode()
+        cache_file, should_process, count = handle_weekend_mode(universe)
 
         if not should_process:
-            print("✅ 今日新闻已缓存，等待周末结束后统一处理。")
-            sys.exit(0)
-
-        # 周末模式：从240条中筛选20条
-        print(f"✅ 抓取到 {len(all_titles)} 条周末累积标题。")
-        top_20 = gemini_stage1_filter(all_titles, target_count=20)
-        is_weekend_data = True
-        date_for_save = base_date  # 使用周五的日期作为标识
+            return None
+
+        print(f"✅ 抓取到 {count} 条周末累积标题。")
+        # 周末标题量可能很大，检查点只记录缓存文件位置，初筛时流式读取
+        data = {"titles_file": cache_file, "count": count, "is_weekend": True}
     else:
         # 工作日模式
         print("📅 工作日模式...")
-        all_titles = fetch_80_titles()
+        all_titles = fetch_universe_titles(universe)
         print(f"✅ 抓取到 {len(all_titles)} 条标题。")
-        top_20 = gemini_stage1_filter(all_titles, target_count=20)
-        is_weekend_data = False
-        date_for_save = today_str
+        if articles is not None:
+            all_titles = [t for t in all_titles if t['url'] not in articles["seen"]]
+            print(f"🆕 增量模式：其中 {len(all_titles)} 条是今天首次出现的新标题")
+        data = {"titles": all_titles, "count": len(all_titles), "is_weekend": False}
 
-    print(f"✅ 初筛 {len(top_20)} 条潜力新闻完成。")
+    checkpoint.save("titles", data)
+    return data
+
+def iter_titles(titles_data):
+    """遍历 titles 检查点中的标题（工作日为列表，周末为流式读取的缓存文件）"""
+    if "titles_file" in titles_data:
+        return iter_weekend_titles(titles_data["titles_file"])
+    return iter(titles_data["titles"])
+
+def load_or_run_stage1(checkpoint, resume, titles_data, target_count=20, focus=""):
+    """
+    阶段2：Gemini 初筛（周末从240条中、工作日从80条中筛选20条）
+    标题数超过 STAGE1_CHUNK_SIZE 时（如多周回补）自动进入锦标赛模式
+    """
+    if resume:
+        data = checkpoint.load("stage1")
+        if data:
+            print(f"♻️  从检查点恢复初筛结果（{len(data['items'])} 条）")
+            return data["items"]
+
+    try:
+        winners = gemini_stage1_tournament(iter_titles(titles_data), target_count=target_count, focus=focus)
+    except GeminiStage1Error as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    ids = [i for i, _ in winners]
+    top_20 = [item for _, item in winners]
+    checkpoint.save("stage1", {"ids": ids, "items": top_20})
+    return top_20
+
+def summarize_article(item):
+    """爬正文并由 Qwen 总结单篇文章，正文为空时返回 None"""
+    raw_text = fetch_content(item['url'])
+    if not raw_text:
+        print(f"  ⚠️  未能获取正文内容，跳过")
+        return None
+    # Qwen 调用间隔由共享的 QWEN_LIMITER 控制
+    return {"title": item['title'], "summary": qwen_summarize(item['title'], raw_text)}
+
+def is_good_summary(entry):
+    return entry is not None and not entry["summary"].startswith("摘要生成失败")
+
+def summarize_articles(checkpoint, resume, top_20, articles, save_dir):
+    """
+    阶段3 & 4：爬全文并由 Qwen 总结，每篇完成后写入检查点和当日文章记录
+    同一进程中其他 universe 已摘要过的文章直接复用
+    """
+    done = (checkpoint.load("summaries") or {}) if resume else {}
+    if done:
+        print(f"♻️  从检查点恢复 {len(done)} 篇摘要")
 
-    # 3 & 4. 爬全文并由 Qwen 总结
     summaries = []
     for i, item in enumerate(top_20):
-        print(f"[{i+1}/{len(top_20)}] 正在深度解析正文并生成摘要: {item['title'][:15]}...")
-        raw_text = fetch_content(item['url'])
-        if raw_text:
-            summary = qwen_summarize(item['title'], raw_text)
-            summaries.append({"title": item['title'], "summary": summary})
-            time.sleep(1.5)
-        else:
-            print(f"  ⚠️  未能获取正文内容，跳过")
+        if item['url'] in done:
+            summaries.append(done[item['url']])
+            continue
 
+        def compute():
+            print(f"[{i+1}/{len(top_20)}] 正在深度解析正文并生成摘要: {item['title'][:15]}...")
+            return summarize_article(item)
+
+        entry, reused = shared_result(_summary_cache, item['url'], compute, keep=is_good_summary)
+        if reused:
+            print(f"[{i+1}/{len(top_20)}] ♻️  复用已生成的摘要: {item['title'][:15]}...")
+        if entry is None:
+            continue
+
+        summaries.append(entry)
+        # 失败的摘要不写入检查点，--resume 时重试
+        if is_good_summary(entry):
+            done[item['url']] = entry
+            checkpoint.save("summaries", done)
+            articles["summaries"][item['url']] = entry
+            save_daily_articles(save_dir, articles)
+    return summaries
+
+def load_or_run_stage2(checkpoint, resume, summaries, focus=""):
+    """
+    阶段5：Gemini 终极研判，保存原始响应
+    Gemini 不可用时改用本地词典评分（local_ranker）
+    返回: (目标交易日, 原始响应, 来源 "gemini"/"local")
+    """
+    if resume:
+        data = checkpoint.load("stage2")
+        if data:
+            print("♻️  从检查点恢复终极研判结果")
+            return data["target_date"], data["raw"], data.get("source", "gemini")
+
+    # 摘要过多时（如增量模式合并了一整天的摘要）先用锦标赛筛选，保持研判 prompt 大小有上限
+    candidates = summaries
+    if len(summaries) > Config.STAGE2_MAX_SUMMARIES:
+        print(f"🏟️  摘要共 {len(summaries)} 条，先筛选出 {Config.STAGE2_MAX_SUMMARIES} 条再研判")
+        try:
+            winners = gemini_stage1_tournament(iter(summaries), target_count=Config.STAGE2_MAX_SUMMARIES,
+                                               with_summary=True, focus=focus)
+            candidates = [item for _, item in winners]
+        except GeminiStage1Error as e:
+            # 筛选失败时保留最新的摘要（增量模式下新摘要在最后）
+            print(f"⚠️  {e}，改为取最新的 {Config.STAGE2_MAX_SUMMARIES} 条")
+            candidates = summaries[-Config.STAGE2_MAX_SUMMARIES:]
+
+    target_date = get_target_trading_day()
+    raw_response = gemini_stage2_rank(candidates, target_date, focus=focus)
+    source = "gemini"
+    if raw_response is None:
+        # 本地评分没有 prompt 大小限制，使用全部摘要
+        print("🧮 改用本地词典评分...")
+        start = time.perf_counter()
+        raw_response = json.dumps(local_rank(summaries), ensure_ascii=False)
+        source = "local"
+        print(f"✅ 本地评分完成（{(time.perf_counter() - start) * 1000:.2f} ms）")
+    checkpoint.save("stage2", {"target_date": target_date, "raw": raw_response, "source": source})
+    return target_date, raw_response, source
+
+def run_pipeline(resume=False, incremental=False, profiler=None, universe=None):
+    """
+    完整的每日预测流程
+    resume=True 时从最后完成的阶段继续；
+    incremental=True 时只处理当天新出现的标题，并在当天全部摘要上重新研判；
+    profiler 为 StageProfiler 时按阶段剖析；
+    universe 为要运行的新闻源 + 研判方向（None 为默认 universe）
+    """
+    universe = universe or get_universe()
+    save_dir = get_save_dir(universe)
+    profiler = profiler or StageProfiler(save_dir)
+    checkpoint = RunCheckpoint(save_dir)
+    articles = load_daily_articles(save_dir)
+
+    def stage(name):
+        # 多个 universe 共用一个 profiler 时按 universe 区分阶段
+        return profiler.stage(name if is_default(universe.name) else f"{universe.name}.{name}")
+
+    if not is_default(universe.name):
+        print(f"\n🌐 universe: {universe.name}（{universe.label}）")
+
+    if resume:
+        last = checkpoint.last_completed()
+        if last == "done":
+            print("✅ 今日流程已完成，无需恢复（如需重新运行请去掉 --resume）")
+            return
+        print(f"♻️  恢复模式：最后完成的阶段为 {last or '无'}")
+    else:
+        checkpoint.clear()
+
+    with stage("titles"):
+        titles_data = load_or_fetch_titles(checkpoint, resume, articles if incremental else None, universe)
+    if titles_data is None:
+        print("✅ 今日新闻已缓存，等待周末结束后统一处理。")
+        return
+
+    is_weekend_data = titles_data["is_weekend"]
+    # 周末模式处理的是累积数据，始终全量研判
+    incremental = incremental and not is_weekend_data
+
+    if incremental and not titles_data["count"]:
+        print("✅ 没有新标题，沿用当前预测。")
+        return
+
+    target_count = incremental_target_count(titles_data["count"]) if incremental else 20
+    with stage("stage1"):
+        top_20 = load_or_run_stage1(checkpoint, resume, titles_data, target_count, universe.focus)
+    print(f"✅ 初筛 {len(top_20)} 条潜力新闻完成。")
+
+    # 本次参与初筛的工作日标题都记为已见过（未入选的后续运行也不再重复初筛）
+    if not is_weekend_data:
+        for t in titles_data["titles"]:
+            articles["seen"][t['url']] = t['title']
+        save_daily_articles(save_dir, articles)
+
+    with stage("summaries"):
+        summaries = summarize_articles(checkpoint, resume, top_20, articles, save_dir)
     print(f"\n✅ 成功生成 {len(summaries)} 条新闻摘要")
 
+    if incremental:
+        # 新标题没有正文或摘要全部失败时，研判输入与上一版本相同，不再重复研判和推送
+        new_count = sum(1 for entry in summaries if is_good_summary(entry))
+        if not new_count:
+            print("✅ 没有新增摘要，沿用当前预测。")
+            return
+        summaries = list(articles["summaries"].values())
+        print(f"🔗 增量模式：新增 {new_count} 条摘要，合并后共 {len(summaries)} 条参与研判")
+
     # 5. 最终研判
     if summaries:
         print(f"开始生成最终研判报告...")
-        target_date = get_next_trading_day()
-        report = gemini_stage2_rank(summaries, target_date)
-
-        # 提取预测信息
-        prediction = extract_prediction(report)
-
-        if prediction:
-            # 判断是单个还是多个股票
-            if isinstance(prediction, list):
-                print(f"\n🎯 预测结果（{len(prediction)}只股票）:")
-                for i, p in enumerate(prediction, 1):
-                    print(f"  {i}. {p['stock_code']} - {p['direction']}")
-            else:
-                print(f"\n🎯 预测结果: {prediction['stock_code']} - {prediction['direction']}")
-        else:
-            print(f"\n⚠️  未能从报告中提取明确的预测信息")
-
-        # 保存传统报告
-        report_path = f"{save_dir}/final_report.txt"
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(report)
-
-        # 保存标准化预测数据供回测使用
-        save_prediction(
-            date_str=date_for_save,
-            target_date=target_date,
-            report=report,
-            prediction=prediction,
-            news_count=len(summaries),
-            is_weekend_data=is_weekend_data
-        )
-
-        # --- 构造并发送 Telegram 消息 ---
-        # 1. 构造精简版头部信息
-        header = f"🔔 *日股交易策略报告* ({target_date})\n"
-        header += "----------------------------\n"
-        
-        # 2. 提取股票简要信息
-        stock_summary = ""
+        with stage("stage2"):
+            target_date, raw_response, source = load_or_run_stage2(checkpoint, resume, summaries, universe.focus)
+
+        with stage("publish"):
+            publish_results(save_dir, checkpoint, raw_response, target_date, summaries,
+                            is_weekend_data, source, universe)
+
+
+def publish_results(save_dir, checkpoint, raw_response, target_date, summaries, is_weekend_data,
+                    source="gemini", universe=None):
+    """
+    阶段6：解析研判结果，保存预测和报告，推送 Telegram
+    预测文件以所预测的交易日（target_date）命名：周末批次和周一盘前增量更新写入同一个文件的不同版本，
+    回测按该交易日评估
+    """
+    # 提取预测信息（结构化 JSON 优先，正则兜底）
+    report, prediction, extraction = parse_stage2_response(raw_response, source)
+    print(f"🧩 预测解析方式: {extraction['method']}（{extraction['latency_ms']} ms）")
+
+    if prediction:
+        # 判断是单个还是多个股票
         if isinstance(prediction, list):
-            for p in prediction:
-                emoji = "🟢" if "涨" in p['direction'] else "🔴"
-                stock_summary += f"{emoji} *{p['stock_code']}* : {p['direction']}\n"
-        elif prediction:
-            emoji = "🟢" if "涨" in prediction['direction'] else "🔴"
-            stock_summary += f"{emoji} *{prediction['stock_code']}* : {prediction['direction']}\n"
-        
-        # 3. 组合完整报告内容并发送
-        full_msg = f"{header}{stock_summary}\n📝 *详细研判报告如下：*\n\n{report}"
-        send_telegram_msg(full_msg)
-        # ----------------------------
-        print(f"\n🔥 全流程结束！报告已生成: {report_path}")
-        print("-" * 30)
-        print(report[:500] + "...")
-
-        # 如果是周末模式，清理缓存
-        if is_weekend_data:
-            cache_file = get_weekend_cache_file()
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
-                print("✅ 周末缓存已清理")
+            print(f"\n🎯 预测结果（{len(prediction)}只股票）:")
+            for i, p in enumerate(prediction, 1):
+                print(f"  {i}. {p['stock_code']} - {p['direction']}")
+        else:
+            print(f"\n🎯 预测结果: {prediction['stock_code']} - {prediction['direction']}")
+    else:
+        print(f"\n⚠️  未能从报告中提取明确的预测信息")
+
+    # 保存标准化预测数据供回测使用
+    version = save_prediction(
+        date_str=target_date,
+        target_date=target_date,
+        report=report,
+        prediction=prediction,
+        news_count=len(summaries),
+        is_weekend_data=is_weekend_data,
+        extraction=extraction,
+        summaries=summaries,
+        universe=universe
+    )
+
+    # 更新跨运行信号索引（失败不影响主流程，可用 signal_index.py rebuild 重建）
+    try:
+        signal_index.index_prediction_file(prediction_path(target_date, universe and universe.name))
+    except Exception as e:
+        print(f"⚠️  信号索引更新失败: {e}")
+
+    # 保存传统报告（final_report.txt 始终是最新版本，各版本另存一份）
+    report_path = f"{save_dir}/final_report.txt"
+    atomic_write_text(report_path, report)
+    atomic_write_text(f"{save_dir}/final_report_v{version}.txt", report)
+
+    # --- 构造并发送 Telegram 消息 ---
+    # 1. 构造精简版头部信息
+    # label 来自用户的 universes.json，需要转义，否则 _ * [ 等字符会让 Telegram 拒收整条消息
+    title = ("日股交易策略报告" if universe is None or is_default(universe.name)
+             else f"日股交易策略报告·{telegram_queue.escape_markdown(universe.label)}")
+    if version > 1:
+        title += f"（更新 v{version}）"
+    header = f"🔔 *{title}* ({target_date})\n"
+    if source == "local":
+        header += "⚠️ Gemini 不可用，以下为本地词典评分结果\n"
+    header += "----------------------------\n"
+
+    # 2. 提取股票简要信息
+    stock_summary = ""
+    if isinstance(prediction, list):
+        for p in prediction:
+            emoji = "🟢" if "涨" in p['direction'] else "🔴"
+            stock_summary += f"{emoji} *{p['stock_code']}* : {p['direction']}\n"
+    elif prediction:
+        emoji = "🟢" if "涨" in prediction['direction'] else "🔴"
+        stock_summary += f"{emoji} *{prediction['stock_code']}* : {prediction['direction']}\n"
+
+    # 3. 组合完整报告内容，入队后台发送
+    send_telegram_msg(f"{header}{stock_summary}\n📝 *详细研判报告如下：*\n\n", report)
+    checkpoint.save("done", {"prediction_date": target_date, "report_path": report_path, "version": version})
+    # ----------------------------
+    print(f"\n🔥 全流程结束！报告已生成: {report_path}")
+    print("-" * 30)
+    print(report[:500] + "...")
+
+    # 如果是周末模式，清理缓存
+    if is_weekend_data:
+        if remove_path(get_weekend_cache_file(universe=universe)):
+            print("✅ 周末缓存已清理")
+
+def run_universes(universes, resume=False, incremental=False, profiler=None, workers=None):
+    """
+    在同一进程中运行多个 universe：共用 HTTP 连接池、新闻源/摘要缓存和 LLM 调用预算
+    workers > 1 时并行运行；单个 universe 失败不影响其他 universe
+    返回失败的 universe 名称列表
+    """
+    workers = max(1, min(workers or Config.UNIVERSE_WORKERS, len(universes)))
+    if workers > 1 and profiler is not None and profiler.enabled:
+        # cProfile 同一时间只能有一个在运行（Python 3.12+ 会报错），CPU 时间也是进程级的，
+        # 并行时各阶段的耗时拆分没有意义
+        print("⚠️  性能剖析模式下按顺序运行各 universe")
+        workers = 1
+
+    def run_one(universe):
+        try:
+            run_pipeline(resume=resume, incremental=incremental, profiler=profiler, universe=universe)
+            return None
+        except SystemExit:
+            print(f"❌ universe {universe.name} 运行失败")
+        except Exception:
+            traceback.print_exc()
+            print(f"❌ universe {universe.name} 运行失败")
+        return universe.name
+
+    if workers == 1:
+        results = [run_one(u) for u in universes]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="universe") as pool:
+            results = list(pool.map(run_one, universes))
+    return [name for name in results if name]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="日股新闻预测（每日运行）")
+    parser.add_argument("--resume", action="store_true",
+                        help="从 report_YYYYMMDD/checkpoint/ 中最后完成的阶段继续运行")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量模式：只抓取/摘要当天新出现的新闻，合并当天全部摘要重新研判并保存新版本预测")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILE_MODES,
+                        help="按阶段剖析性能，结果写入 report_YYYYMMDD/profile/news_today/（speedscope 模式另存火焰图）")
+    parser.add_argument("--universe", action="append", dest="universes", metavar="NAME",
+                        help="运行指定的 universe（可重复，默认为配置项 UNIVERSES）")
+    parser.add_argument("--all-universes", action="store_true",
+                        help="运行内置及 universes.json 中定义的全部 universe")
+    args = parser.parse_args()
+
+    try:
+        names = list(get_universes()) if args.all_universes else (args.universes or Config.UNIVERSES)
+        universes = [get_universe(name) for name in dict.fromkeys(names)]
+    except (KeyError, ValueError) as e:
+        print(f"❌ {e.args[0]}")
+        sys.exit(1)
+
+    profiler = StageProfiler(get_save_dir(), mode=args.profile, label="news_today")
+    failed = []
+    try:
+        # 单实例：cron 与手动重跑重叠时，后启动的直接退出
+        with single_instance("news_today"):
+            failed = run_universes(universes, resume=args.resume, incremental=args.incremental, profiler=profiler)
+            # 全部 universe 结束后统一等待 Telegram 队列发送完毕（超时未发出的消息保留到下次运行），
+            # 不让每个 universe 各自等待
+            telegram_queue.flush(timeout=Config.TELEGRAM_FLUSH_TIMEOUT)
+    except AlreadyRunningError as e:
+        print(f"⏳ {e}，本次运行退出")
+    finally:
+        profiler.report()
+
+    if failed:
+        # 以非零状态退出，run_daily.sh 会以 --resume 重试（已完成的 universe 直接跳过）
+        print(f"❌ 以下 universe 运行失败: {', '.join(failed)}")
+        sys.exit(1)
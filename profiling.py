@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+分阶段性能剖析（news_today.py / backtest.py 的 --profile 模式）
+- 每个阶段用 cProfile 记录，输出 <报告目录>/profile/<入口>/<阶段>.prof（可用 snakeviz / pstats 查看）
+- --profile speedscope 时另外用采样器记录主线程调用栈，输出 <阶段>.speedscope.json
+  （拖进 https://www.speedscope.app 查看火焰图）
+- 结束时打印各阶段 墙钟/CPU/网络等待/sleep 耗时和 Top-N 热点函数，并写入 profile/<入口>/summary.json
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from storage import atomic_write_json
+
+PROFILE_MODES = ("cprofile", "speedscope")
+
+# cProfile 中属于网络 I/O 的内置函数（socket / ssl / DNS）
+NETWORK_MARKERS = ("_socket.", "_ssl.", "getaddrinfo", "gethostbyname")
+SLEEP_MARKERS = ("time.sleep",)
+
+def _classify_wait(stats):
+    """从 cProfile 统计中汇总网络 I/O 和 sleep 的耗时（秒）"""
+    network = sleep = 0.0
+    for (filename, _, func), (_, _, tottime, _, _) in stats.stats.items():
+        if filename != "~":
+            continue
+        if any(m in func for m in NETWORK_MARKERS):
+            network += tottime
+        elif any(m in func for m in SLEEP_MARKERS):
+            sleep += tottime
+    return network, sleep
+
+class StackSampler(threading.Thread):
+    """定时采样目标线程的调用栈，生成 speedscope 的 sampled 格式"""
+
+    def __init__(self, target_thread_id, interval=0.005):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.target = target_thread_id
+        self.interval = interval
+        self.frames = []
+        self.frame_index = {}
+        self.samples = []
+        self.weights = []
+        self.stopped = threading.Event()
+
+    def _frame_id(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frame_index:
+            self.frame_index[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return self.frame_index[key]
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def to_speedscope(self, name):
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(self.weights),
+                "samples": self.samples,
+                "weights": self.weights
+            }],
+            "name": name,
+            "exporter": "profiling.py"
+        }
+
+class StageProfiler:
+    """
+    按阶段剖析：
+        profiler = StageProfiler(save_dir, mode="cprofile", label="news_today")
+        with profiler.stage("stage1"):
+            ...
+        profiler.report()
+    mode 为 None 时不做任何剖析（stage() 是空上下文）
+    """
+
+    def __init__(self, save_dir, mode=None, label="news_today", top_n=15):
+        self.mode = mode
+        self.top_n = top_n
+        self.out_dir = os.path.join(save_dir, "profile", label)
+        self.results = []
+        self.stats = {}
+
+    @property
+    def enabled(self):
+        return self.mode is not None
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        sampler = None
+        if self.mode == "speedscope":
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+
+        profile = cProfile.Profile()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            if sampler:
+                sampler.stop()
+            self._record(name, profile, wall, cpu, sampler)
+
+    def _record(self, name, profile, wall, cpu, sampler):
+        prof_path = os.path.join(self.out_dir, f"{name}.prof")
+        profile.dump_stats(prof_path)
+        stats = pstats.Stats(profile)
+        network, sleep = _classify_wait(stats)
+        self.stats[name] = profile
+        self.results.append({
+            "stage": name,
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3),
+            "network_wait_s": round(network, 3),
+            "sleep_s": round(sleep, 3),
+            # 其余等待：线程 join、锁、磁盘 I/O 等
+            "other_wait_s": round(max(wall - cpu - network - sleep, 0.0), 3),
+            "prof": prof_path
+        })
+        if sampler:
+            scope_path = os.path.join(self.out_dir, f"{name}.speedscope.json")
+            atomic_write_json(scope_path, sampler.to_speedscope(name), indent=None)
+            self.results[-1]["speedscope"] = scope_path
+
+    def hotspots(self, name):
+        """某阶段按自身耗时排序的 Top-N 函数"""
+        out = io.StringIO()
+        pstats.Stats(self.stats[name], stream=out).sort_stats("tottime").print_stats(self.top_n)
+        return out.getvalue()
+
+    def report(self):
+        """打印各阶段耗时拆分和热点，并写入 summary.json"""
+        if not self.enabled or not self.results:
+            return
+
+        print("\n" + "=" * 80)
+        print("⏱️  分阶段性能剖析")
+        print("=" * 80)
+        print(f"{'阶段':<14} {'墙钟':>8} {'CPU':>8} {'网络等待':>8} {'sleep':>8} {'其他等待':>8}")
+        for r in self.results:
+            print(f"{r['stage']:<14} {r['wall_s']:>7.2f}s {r['cpu_s']:>7.2f}s {r['network_wait_s']:>7.2f}s "
+                  f"{r['sleep_s']:>7.2f}s {r['other_wait_s']:>7.2f}s")
+
+        total_wall = sum(r["wall_s"] for r in self.results)
+        total_net = sum(r["network_wait_s"] for r in self.results)
+        total_cpu = sum(r["cpu_s"] for r in self.results)
+        if total_wall > 0:
+            print(f"\n合计 {total_wall:.2f}s：CPU {total_cpu / total_wall * 100:.1f}%，"
+                  f"网络等待 {total_net / total_wall * 100:.1f}%")
+
+        for r in self.results:
+            print(f"\n--- {r['stage']} Top {self.top_n} 热点（按自身耗时） ---")
+            print(self.hotspots(r["stage"]).strip())
+
+        summary_path = os.path.join(self.out_dir, "summary.json")
+        atomic_write_json(summary_path, {"mode": self.mode, "stages": self.results})
+        print(f"\n✅ 剖析结果已保存: {self.out_dir}/")
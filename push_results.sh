@@ -28,11 +28,17 @@ PRED_COUNT=0
 REPORT_COUNT=0
 BACKTEST_COUNT=0
 
-# 1. 复制预测文件
-if ls predictions/prediction_*.json 1> /dev/null 2>&1; then
+# 1. 复制预测文件（含 predictions/<universe>/ 子目录）
+if ls predictions/prediction_*.json predictions/*/prediction_*.json 1> /dev/null 2>&1; then
     mkdir -p "$TEMP_DIR/predictions"
-    cp predictions/prediction_*.json "$TEMP_DIR/predictions/"
-    PRED_COUNT=$(ls "$TEMP_DIR/predictions"/prediction_*.json 2>/dev/null | wc -l | tr -d ' ')
+    cp predictions/prediction_*.json "$TEMP_DIR/predictions/" 2>/dev/null
+    for dir in predictions/*/; do
+        if ls "$dir"prediction_*.json 1> /dev/null 2>&1; then
+            mkdir -p "$TEMP_DIR/$dir"
+            cp "$dir"prediction_*.json "$TEMP_DIR/$dir"
+        fi
+    done
+    PRED_COUNT=$(find "$TEMP_DIR/predictions" -name 'prediction_*.json' | wc -l | tr -d ' ')
     echo "   ✓ 找到 $PRED_COUNT 个预测文件"
 else
     echo "   ⚠️  没有找到预测文件"
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+进程内共享的 LLM 调用速率限制
+同一进程中的所有 universe（以及它们的线程）共用一个预算：
+任意 60 秒窗口内的调用次数不超过 calls_per_minute，超出时阻塞等待
+"""
+import threading
+import time
+from collections import deque
+
+class RateLimiter:
+    """滑动窗口限流器（线程安全）"""
+
+    def __init__(self, calls_per_minute, name="", window=60.0):
+        self.limit = max(int(calls_per_minute), 1)
+        self.name = name
+        self.window = window
+        self.calls = deque()
+        self.lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self):
+        """占用一次调用额度，必要时等待；返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= self.window:
+                    self.calls.popleft()
+                if len(self.calls) < self.limit:
+                    self.calls.append(now)
+                    self.waited += waited
+                    return waited
+                delay = self.window - (now - self.calls[0])
+            if waited == 0.0:
+                print(f"  ⏳ {self.name} 调用达到每分钟 {self.limit} 次的上限，等待 {delay:.1f} 秒")
+            time.sleep(delay)
+            waited += delay
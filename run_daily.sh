@@ -48,6 +48,12 @@ mkdir -p predictions weekend_cache
 echo "✅ 目录就绪"
 echo ""
 
+# 0. 每周一刷新东证股票主表（失败时继续使用现有主表）
+if [ "$(date +%u)" = "1" ] && [ -f "tse_tickers.py" ]; then
+    echo "📚 刷新东证股票主表..."
+    python3 tse_tickers.py refresh || echo "⚠️  股票主表刷新失败，继续使用现有主表"
+fi
+
 # 1. 运行历史预测回测
 echo "📊 正在进行历史预测回测..."
 if [ -f "backtest.py" ]; then
@@ -59,7 +65,12 @@ fi
 # 2. 生成今日预测
 echo "🎯 正在生成今日预测..."
 if [ -f "news_today.py" ]; then
-    python3 news_today.py
+    if ! python3 news_today.py; then
+        # 失败时从检查点恢复一次，已完成的抓取/摘要不会重复执行
+        echo "⚠️  预测流程失败，60 秒后从检查点恢复..."
+        sleep 60
+        python3 news_today.py --resume
+    fi
 else
     echo "❌ news_today.py 不存在，退出"
     exit 1
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+跨运行的 股票/新闻 信号索引（SQLite + FTS5）
+把每次预测的个股、研判所用的新闻摘要、回测结果写入本地 signal_index.db，
+用于毫秒级查询"某只股票的历次预测及其前置新闻"和"某个关键词出现在哪些天"
+所有记录按 universe 区分（默认 universe 的输出不加前缀）
+
+命令行:
+    python3 signal_index.py ticker 8035.T     # 某只股票的历次预测、回测结果和当天的新闻
+    python3 signal_index.py keyword 半導体     # 全文检索新闻摘要，附带当天的预测
+    python3 signal_index.py date 2026-02-05   # 某天的预测和新闻
+    python3 signal_index.py stats             # 按股票汇总的正确率
+    python3 signal_index.py rebuild           # 从 predictions/（含各 universe 子目录）和 report_*/ 重建索引
+"""
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from universes import DEFAULT_UNIVERSE, iter_prediction_files, universe_path
+
+INDEX_FILE = "./signal_index.db"
+PREDICTIONS_DIR = "./predictions"
+CUMULATIVE_STATS_FILE = "./backtest_cumulative_stats.json"
+
+# 表结构变化时递增，旧版本索引在打开时自动重建
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    universe TEXT NOT NULL DEFAULT 'tse',
+    date TEXT NOT NULL,
+    target_date TEXT,
+    version INTEGER,
+    stock_code TEXT NOT NULL,
+    name TEXT,
+    sector TEXT,
+    direction TEXT,
+    confidence REAL,
+    method TEXT,
+    source_file TEXT,
+    UNIQUE(universe, date, stock_code)
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_stock ON predictions(stock_code, date);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    id INTEGER PRIMARY KEY,
+    universe TEXT NOT NULL DEFAULT 'tse',
+    date TEXT NOT NULL,
+    title TEXT,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_summaries_date ON summaries(date, universe);
+
+CREATE TABLE IF NOT EXISTS outcomes (
+    universe TEXT NOT NULL DEFAULT 'tse',
+    date TEXT NOT NULL,
+    stock_code TEXT NOT NULL,
+    actual_change REAL,
+    is_correct INTEGER,
+    return_rate REAL,
+    PRIMARY KEY (universe, date, stock_code)
+);
+
+CREATE TRIGGER IF NOT EXISTS summaries_ai AFTER INSERT ON summaries BEGIN
+    INSERT INTO summaries_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS summaries_ad AFTER DELETE ON summaries BEGIN
+    INSERT INTO summaries_fts(summaries_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary);
+END;
+"""
+
+def open_index(path=INDEX_FILE):
+    """打开（必要时创建）索引数据库；旧版本结构的索引会先从归档重建"""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION and conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'predictions'").fetchone():
+        conn.close()
+        print("⚠️  信号索引结构已更新（按 universe 区分），从归档重建...")
+        rebuild_index(path)
+        return open_index(path)
+    # 日文/中文没有空格分词，用 trigram 分词器；旧版 SQLite 不支持时退回 unicode61
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5("
+                     "title, summary, content='summaries', content_rowid='id', tokenize='trigram')")
+    except sqlite3.OperationalError:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5("
+                     "title, summary, content='summaries', content_rowid='id')")
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return conn
+
+def load_report_summaries(date, universe=DEFAULT_UNIVERSE):
+    """旧预测文件没有 summaries 字段时，从当天报告目录的文章记录中取摘要"""
+    report_dir = universe_path(f"report_{date.replace('-', '')}", universe)
+    for path, key in ((os.path.join(report_dir, "daily_articles.json"), "summaries"),
+                      (os.path.join(report_dir, "checkpoint", "summaries.json"), "data")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return list(json.load(f)[key].values())
+        except (OSError, ValueError, KeyError, AttributeError):
+            continue
+    return []
+
+def index_prediction(conn, pred_data, source_file=None):
+    """写入一个预测文件的内容（同一天重复写入时覆盖旧记录）"""
+    date = pred_data.get("date")
+    if not date:
+        return 0
+    universe = pred_data.get("universe") or DEFAULT_UNIVERSE
+    prediction = pred_data.get("prediction") or []
+    predictions_list = [prediction] if isinstance(prediction, dict) else prediction
+    method = (pred_data.get("extraction") or {}).get("method", "regex")
+
+    with conn:
+        conn.execute("DELETE FROM predictions WHERE date = ? AND universe = ?", (date, universe))
+        conn.execute("DELETE FROM summaries WHERE date = ? AND universe = ?", (date, universe))
+        for p in predictions_list:
+            if not p.get("stock_code"):
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO predictions (universe, date, target_date, version, stock_code, name, sector,"
+                " direction, confidence, method, source_file) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (universe, date, pred_data.get("target_date"),
+                 pred_data.get("version") if isinstance(pred_data.get("version"), int) else 1,
+                 p["stock_code"], p.get("name"), p.get("sector"), p.get("direction"),
+                 p.get("confidence"), method, source_file))
+        summaries = pred_data.get("summaries") or load_report_summaries(date, universe)
+        conn.executemany(
+            "INSERT INTO summaries (universe, date, title, summary) VALUES (?, ?, ?, ?)",
+            [(universe, date, s.get("title"), s.get("summary")) for s in summaries])
+    return len(predictions_list)
+
+def index_prediction_file(path, conn=None):
+    """索引单个预测文件（每次运行结束后调用）"""
+    own = conn is None
+    conn = conn or open_index()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return index_prediction(conn, json.load(f), source_file=str(path))
+    finally:
+        if own:
+            conn.close()
+
+def record_outcomes(results, conn=None):
+    """写入回测结果（backtest.py 每次回测后调用）"""
+    own = conn is None
+    conn = conn or open_index()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO outcomes (universe, date, stock_code, actual_change, is_correct, return_rate)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(r.get("universe") or DEFAULT_UNIVERSE, r["date"], r["stock_code"], r["actual_change"],
+                  int(r["is_correct"]), r["return_rate"]) for r in results])
+    finally:
+        if own:
+            conn.close()
+
+def rebuild_index(path=INDEX_FILE):
+    """删除并从归档（predictions/、report_*/、累计回测记录）重建索引"""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = open_index(path)
+    files = [pred_file for _, pred_file in iter_prediction_files(PREDICTIONS_DIR)]
+    count = 0
+    for pred_file in files:
+        try:
+            count += index_prediction_file(pred_file, conn)
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️  跳过 {pred_file.name}: {e}")
+
+    # 回测结果：累计统计中只保留了最近的记录
+    try:
+        with open(CUMULATIVE_STATS_FILE, "r", encoding="utf-8") as f:
+            record_outcomes(json.load(f).get("history", []), conn)
+    except (OSError, ValueError):
+        pass
+    conn.close()
+    print(f"✅ 索引已重建: {len(files)} 个预测文件，{count} 条个股预测 → {path}")
+
+def query_ticker(conn, stock_code, news_limit=5):
+    """某只股票的历次预测（含回测结果）及当天的前置新闻"""
+    rows = conn.execute(
+        "SELECT p.*, o.actual_change, o.is_correct, o.return_rate FROM predictions p"
+        " LEFT JOIN outcomes o ON o.universe = p.universe AND o.date = p.date AND o.stock_code = p.stock_code"
+        " WHERE p.stock_code = ? ORDER BY p.date DESC", (stock_code,)).fetchall()
+    results = []
+    for row in rows:
+        news = conn.execute("SELECT title, summary FROM summaries WHERE date = ? AND universe = ? ORDER BY id LIMIT ?",
+                            (row["date"], row["universe"], news_limit)).fetchall()
+        results.append((dict(row), [dict(n) for n in news]))
+    return results
+
+def query_keyword(conn, keyword, limit=20):
+    """全文检索新闻摘要，附带当天的预测"""
+    if len(keyword) >= 3:
+        # FTS5 短语查询（转义双引号）
+        rows = conn.execute(
+            "SELECT s.universe, s.date, s.title, s.summary FROM summaries_fts f JOIN summaries s ON s.id = f.rowid"
+            " WHERE summaries_fts MATCH ? ORDER BY s.date DESC LIMIT ?",
+            ('"' + keyword.replace('"', '""') + '"', limit)).fetchall()
+    else:
+        # trigram 分词无法匹配少于 3 个字符的词，退回 LIKE
+        pattern = f"%{keyword}%"
+        rows = conn.execute(
+            "SELECT universe, date, title, summary FROM summaries WHERE title LIKE ? OR summary LIKE ?"
+            " ORDER BY date DESC LIMIT ?", (pattern, pattern, limit)).fetchall()
+    results = []
+    for row in rows:
+        preds = conn.execute(
+            "SELECT p.stock_code, p.name, p.direction, o.is_correct, o.actual_change FROM predictions p"
+            " LEFT JOIN outcomes o ON o.universe = p.universe AND o.date = p.date AND o.stock_code = p.stock_code"
+            " WHERE p.date = ? AND p.universe = ?", (row["date"], row["universe"])).fetchall()
+        results.append((dict(row), [dict(p) for p in preds]))
+    return results
+
+def query_date(conn, date):
+    """某天各 universe 的预测和新闻"""
+    preds = conn.execute(
+        "SELECT p.*, o.actual_change, o.is_correct, o.return_rate FROM predictions p"
+        " LEFT JOIN outcomes o ON o.universe = p.universe AND o.date = p.date AND o.stock_code = p.stock_code"
+        " WHERE p.date = ? ORDER BY p.universe", (date,)).fetchall()
+    news = conn.execute("SELECT universe, title, summary FROM summaries WHERE date = ? ORDER BY universe, id",
+                        (date,)).fetchall()
+    return [dict(p) for p in preds], [dict(n) for n in news]
+
+def query_stats(conn):
+    """按 universe、股票汇总预测次数、已回测次数和正确率"""
+    return [dict(r) for r in conn.execute(
+        "SELECT p.universe, p.stock_code, MAX(p.name) AS name, COUNT(*) AS predictions,"
+        " COUNT(o.is_correct) AS evaluated, SUM(o.is_correct) AS correct, SUM(o.return_rate) AS total_return"
+        " FROM predictions p"
+        " LEFT JOIN outcomes o ON o.universe = p.universe AND o.date = p.date AND o.stock_code = p.stock_code"
+        " GROUP BY p.universe, p.stock_code ORDER BY p.universe, predictions DESC").fetchall()]
+
+def _universe_tag(row):
+    """非默认 universe 的输出前缀"""
+    return "" if row.get("universe", DEFAULT_UNIVERSE) == DEFAULT_UNIVERSE else f"[{row['universe']}] "
+
+def _outcome_text(row):
+    if row.get("is_correct") is None:
+        return "未回测"
+    return f"{'✅' if row['is_correct'] else '❌'} {row['actual_change']:+.2f}%"
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "rebuild":
+        rebuild_index()
+        sys.exit(0)
+
+    if not os.path.exists(INDEX_FILE):
+        print("⚠️  索引不存在，先从归档重建...")
+        rebuild_index()
+
+    conn = open_index()
+    start = time.perf_counter()
+    if command == "ticker" and len(sys.argv) > 2:
+        for pred, news in query_ticker(conn, sys.argv[2].upper()):
+            print(f"{_universe_tag(pred)}{pred['date']}  {pred['stock_code']} {pred.get('name') or ''}  "
+                  f"{pred['direction']}  {_outcome_text(pred)}")
+            for n in news:
+                print(f"    · {n['title']}")
+    elif command == "keyword" and len(sys.argv) > 2:
+        for news, preds in query_keyword(conn, sys.argv[2]):
+            calls = "，".join(f"{p['stock_code']} {p['direction']} {_outcome_text(p)}" for p in preds) or "无预测"
+            print(f"{_universe_tag(news)}{news['date']}  {news['title']}\n    → {calls}")
+    elif command == "date" and len(sys.argv) > 2:
+        preds, news = query_date(conn, sys.argv[2])
+        for p in preds:
+            print(f"🎯 {_universe_tag(p)}{p['stock_code']} {p.get('name') or ''}  {p['direction']}  {_outcome_text(p)}")
+        for n in news:
+            print(f"    · {_universe_tag(n)}{n['title']}: {n['summary']}")
+    elif command == "stats":
+        for r in query_stats(conn):
+            accuracy = f"{r['correct'] / r['evaluated'] * 100:.1f}%" if r["evaluated"] else "-"
+            print(f"{_universe_tag(r)}{r['stock_code']:<8} {r['name'] or '':<20} 预测 {r['predictions']:<4} "
+                  f"已回测 {r['evaluated']:<4} 正确率 {accuracy}")
+    else:
+        print(__doc__)
+        sys.exit(1)
+    print(f"\n⏱️  查询耗时 {(time.perf_counter() - start) * 1000:.2f} ms")
+    conn.close()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+存储层：文件锁 + 原子写入
+- file_lock(path)：对某个文件/目录加建议锁（fcntl.flock），锁文件统一放在 .locks/ 下，不污染数据目录；
+  remove_path 删除目标后一并删除其锁文件，.locks/ 不会随清理旧文件无限增长
+- atomic_write_json / atomic_write_text：写临时文件 → fsync → os.replace，
+  读者只会看到旧版本或完整的新版本，不需要加锁
+- 读-改-写（预测版本、累计统计、周末缓存追加）和删除需要在 file_lock 内进行
+- load_json：文件损坏时抛出 CorruptFileError（可选移到 <文件>.corrupt-时间戳），不静默重置
+- single_instance(name)：进程级单实例锁，已有实例在运行时抛出 AlreadyRunningError
+没有 fcntl 的平台（Windows）上锁退化为空操作
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_DIR = "./.locks"
+
+class StorageError(Exception):
+    """存储层错误基类"""
+
+class LockTimeout(StorageError):
+    """在限定时间内没有拿到锁"""
+
+class AlreadyRunningError(StorageError):
+    """同名实例已在运行"""
+
+class CorruptFileError(StorageError):
+    """JSON 文件内容损坏"""
+
+def _lock_path(path):
+    """锁文件路径：按相对路径命名，同一个目标在不同进程中对应同一个锁文件"""
+    name = re.sub(r"[^\w.-]", "_", os.path.relpath(os.path.abspath(path)))
+    return os.path.join(LOCK_DIR, f"{name}.lock")
+
+@contextmanager
+def file_lock(path, shared=False, timeout=None):
+    """
+    对 path 加建议锁（flock 不可重入：同一进程内不要嵌套锁同一个 path）
+    shared=True 为共享锁（只读）；timeout=None 一直等待，timeout=0 拿不到立即抛出 LockTimeout
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    lock_path = _lock_path(path)
+    mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        lock_file = open(lock_path, "a+")
+        try:
+            while True:
+                try:
+                    fcntl.flock(lock_file, mode | (fcntl.LOCK_NB if deadline is not None else 0))
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise LockTimeout(f"等待 {path} 的锁超时（{timeout} 秒）")
+                    time.sleep(0.1)
+        except BaseException:
+            lock_file.close()
+            raise
+        # 等待期间锁文件可能已被 remove_path 删除，拿到的是旧文件上的锁，需要重新打开
+        if _is_current(lock_file, lock_path):
+            break
+        lock_file.close()
+
+    try:
+        yield
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+def _is_current(lock_file, lock_path):
+    """已打开的锁文件是否仍是 lock_path 指向的文件"""
+    try:
+        return os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino
+    except FileNotFoundError:
+        return False
+
+def atomic_write_text(path, text):
+    """写入临时文件后 os.replace，保证文件要么是旧版本要么是完整的新版本"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def atomic_write_json(path, data, indent=2):
+    """原子写入 JSON"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+def append_lines(path, lines):
+    """加锁追加多行（JSON Lines 缓存），一次 write 写入，中断时最多留下半行"""
+    lines = list(lines)
+    if not lines:
+        return
+    with file_lock(path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+def quarantine(path):
+    """把损坏的文件改名留档，返回新路径"""
+    target = f"{path}.corrupt-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    os.replace(path, target)
+    return target
+
+def load_json(path, default=None, quarantine_corrupt=True):
+    """
+    读取 JSON 文件；不存在时返回 default
+    内容损坏时抛出 CorruptFileError（调用方决定中止还是重建）：
+    quarantine_corrupt=True 时先把原文件改名留档（调用方会重建该文件），
+    False 时原地保留，之后的每次运行都会继续报错，直到人工处理
+    """
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except ValueError as e:
+        if not quarantine_corrupt:
+            raise CorruptFileError(f"{path} 已损坏（{e}）") from e
+        moved = quarantine(path)
+        raise CorruptFileError(f"{path} 已损坏（{e}），原文件已移至 {moved}") from e
+
+def remove_path(path):
+    """
+    加锁删除文件或目录（与持有同一把锁的写入方互斥），返回是否删除
+    持有锁期间一并删除锁文件；正在等待的进程拿到锁后会发现文件已失效并重新打开
+    """
+    with file_lock(path):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+            else:
+                return False
+        finally:
+            if fcntl is not None and os.path.exists(_lock_path(path)):
+                os.remove(_lock_path(path))
+    return True
+
+@contextmanager
+def single_instance(name):
+    """
+    单实例锁：同名实例已在运行时立即抛出 AlreadyRunningError
+    锁文件中记录持有者的 PID，便于排查
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    path = os.path.join(LOCK_DIR, f"{name}.pid")
+    with open(path, "a+") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.seek(0)
+            holder = lock_file.read().strip() or "未知"
+            raise AlreadyRunningError(f"{name} 已有实例在运行（PID {holder}）")
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        try:
+            yield
+        finally:
+            lock_file.seek(0)
+            lock_file.truncate()
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Telegram 消息投递队列
+- 消息先拆分、转义后落盘到 telegram_queue/，再由后台线程按顺序发送
+- 遵守 429 的 retry_after；未发出的消息保留在磁盘上，下次运行继续发送
+- Markdown 转义在入队前完成，不再需要"失败后改纯文本重发"
+
+命令行:
+    python3 telegram_queue.py flush            # 发送积压的消息
+    python3 telegram_queue.py stub [端口]       # 启动本地假 Bot API（测试用）
+然后在 .env 中设置 TELEGRAM_API_BASE=http://127.0.0.1:端口
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from config import Config
+from storage import atomic_write_json, file_lock, LockTimeout
+
+QUEUE_DIR = "./telegram_queue"
+FAILED_DIR = os.path.join(QUEUE_DIR, "failed")
+
+# Telegram 单条消息上限 4096 字符，预留分段前缀 "(第N/M部分)\n" 的长度
+TELEGRAM_MAX_LENGTH = 4096
+PART_PREFIX_RESERVE = 20
+
+MAX_ATTEMPTS = 5
+
+def escape_markdown(text):
+    """转义 Telegram Markdown（旧版）中的特殊字符 _ * ` ["""
+    return re.sub(r'([_*`\[])', r'\\\1', text)
+
+def _hard_split(text, limit):
+    """按长度强制切分，不在转义反斜杠之后断开"""
+    chunks = []
+    while len(text) > limit:
+        cut = limit
+        if text[cut - 1] == "\\":
+            cut -= 1
+        chunks.append(text[:cut])
+        text = text[cut:]
+    if text:
+        chunks.append(text)
+    return chunks
+
+def split_message(text, limit=TELEGRAM_MAX_LENGTH - PART_PREFIX_RESERVE, header=""):
+    """
+    按段落 → 行 → 长度的优先级拆分消息，每段不超过 limit
+    header 不参与拆分，拼接在第一段之前（正文按 limit - len(header) 拆分，头部不会单独成段）
+    """
+    if header:
+        chunks = split_message(text, limit - len(header))
+        return [header + chunks[0]] + chunks[1:] if chunks else [header]
+
+    chunks = []
+    current = ""
+    for paragraph in text.split("\n\n"):
+        pieces = [paragraph]
+        if len(paragraph) > limit:
+            # 超长段落按行拆，仍然超长的行再按长度切
+            pieces = []
+            for line in paragraph.split("\n"):
+                pieces.extend(_hard_split(line, limit) if len(line) > limit else [line])
+
+        for j, piece in enumerate(pieces):
+            sep = "\n\n" if j == 0 else "\n"
+            candidate = f"{current}{sep}{piece}" if current else piece
+            if len(candidate) <= limit:
+                current = candidate
+            else:
+                if current:
+                    chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def enqueue_message(markdown_header, body, chat_id=None):
+    """
+    把一条消息拆分后加入发送队列
+    markdown_header: 已经是 Markdown 格式的头部（原样发送）
+    body: 纯文本正文（入队前转义）
+    返回入队的分段数
+    """
+    os.makedirs(QUEUE_DIR, exist_ok=True)
+    chat_id = chat_id or Config.TELEGRAM_CHAT_ID
+
+    chunks = split_message(escape_markdown(body), header=markdown_header)
+    batch = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    for i, chunk in enumerate(chunks):
+        text = f"(第{i+1}/{len(chunks)}部分)\n{chunk}" if len(chunks) > 1 else chunk
+        item = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "Markdown",
+            "attempts": 0,
+            "created": datetime.now().isoformat()
+        }
+        atomic_write_json(os.path.join(QUEUE_DIR, f"{batch}_{i:03d}.json"), item, indent=None)
+    print(f"📨 Telegram 消息已入队: {len(chunks)} 段")
+    return len(chunks)
+
+def pending_messages():
+    """按入队顺序返回待发送的队列文件"""
+    if not os.path.isdir(QUEUE_DIR):
+        return []
+    return sorted(
+        os.path.join(QUEUE_DIR, name) for name in os.listdir(QUEUE_DIR)
+        if name.endswith(".json")
+    )
+
+class TelegramSender(threading.Thread):
+    """后台发送线程：顺序发送队列中的消息，直到队列为空或遇到无法继续的错误"""
+
+    def __init__(self, token=None, api_base=None):
+        super().__init__(name="telegram-sender", daemon=True)
+        self.token = token or Config.TELEGRAM_TOKEN
+        self.api_base = (api_base or Config.TELEGRAM_API_BASE).rstrip("/")
+        self.sent = 0
+        self.failed = 0
+        self.blocked = False
+        self.stopped = threading.Event()
+
+    def run(self):
+        # 同一时刻只允许一个进程发送队列，避免重复发送
+        try:
+            with file_lock(QUEUE_DIR, timeout=0):
+                self._drain()
+        except LockTimeout:
+            print("⏳ 另一个进程正在发送 Telegram 队列，消息将由其发出")
+            self.blocked = True
+
+    def _drain(self):
+        url = f"{self.api_base}/bot{self.token}/sendMessage"
+        # 重新扫描队列，直到清空（发送期间新入队的消息也会被发出）
+        while not self.stopped.is_set():
+            paths = pending_messages()
+            if not paths:
+                break
+            for path in paths:
+                if self.stopped.is_set():
+                    return
+                if not self._send_file(url, path):
+                    self.blocked = True
+                    return
+
+    def _send_file(self, url, path):
+        """发送单个队列文件，返回是否可以继续发送后面的消息"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                item = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  跳过损坏的队列文件 {path}: {e}")
+            self._move_to_failed(path)
+            return True
+
+        payload = {k: item[k] for k in ("chat_id", "text", "parse_mode") if item.get(k)}
+        while item["attempts"] < MAX_ATTEMPTS and not self.stopped.is_set():
+            item["attempts"] += 1
+            try:
+                res = requests.post(url, json=payload, timeout=10)
+            except Exception as e:
+                print(f"⚠️  TG 发送异常: {e}，重试 {item['attempts']}/{MAX_ATTEMPTS}")
+                self.stopped.wait(2 ** item["attempts"])
+                continue
+
+            if res.status_code == 200:
+                os.remove(path)
+                self.sent += 1
+                print(f"🚀 Telegram 消息已发送: {os.path.basename(path)}")
+                return True
+
+            if res.status_code == 429:
+                try:
+                    retry_after = res.json().get("parameters", {}).get("retry_after", 5)
+                except ValueError:
+                    retry_after = 5
+                print(f"⏳ Telegram 限流，{retry_after} 秒后重试")
+                item["attempts"] -= 1  # 限流不计入失败次数
+                self.stopped.wait(retry_after)
+                continue
+
+            if 400 <= res.status_code < 500:
+                # 4xx（除 429）重发也不会成功，移到 failed/ 留档
+                print(f"❌ Telegram 拒绝消息 ({res.status_code}): {res.text[:200]}")
+                self._move_to_failed(path)
+                return True
+
+            print(f"⚠️  Telegram 返回 {res.status_code}，重试 {item['attempts']}/{MAX_ATTEMPTS}")
+            self.stopped.wait(2 ** item["attempts"])
+
+        # 保留在队列中（记录尝试次数），下次运行继续；为保证顺序，不再发送后面的消息
+        if item["attempts"] >= MAX_ATTEMPTS:
+            item["attempts"] = 0
+        atomic_write_json(path, item, indent=None)
+        return False
+
+    def _move_to_failed(self, path):
+        os.makedirs(FAILED_DIR, exist_ok=True)
+        os.replace(path, os.path.join(FAILED_DIR, os.path.basename(path)))
+        self.failed += 1
+
+_sender = None
+_sender_lock = threading.Lock()
+
+def start_sender():
+    """启动后台发送线程（已在运行则直接返回；多个 universe 并行时只启动一个）"""
+    global _sender
+    with _sender_lock:
+        if _sender is None or not _sender.is_alive():
+            _sender = TelegramSender()
+            _sender.start()
+        return _sender
+
+def flush(timeout=None):
+    """
+    等待后台线程发送完队列，最多等待 timeout 秒
+    返回 (已发送, 发送失败, 仍在队列中)
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    sent = failed = 0
+    while True:
+        sender = start_sender()
+        sender.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        if sender.is_alive():
+            sender.stopped.set()
+        sent, failed = sent + sender.sent, failed + sender.failed
+        sender.sent = sender.failed = 0
+        # 线程在检查到空队列之后才有新消息入队时，再启动一轮
+        if sender.is_alive() or sender.blocked or not pending_messages():
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+
+    pending = len(pending_messages())
+    if failed:
+        print(f"❌ Telegram: {failed} 段消息被拒绝，已移至 {FAILED_DIR}")
+    if pending:
+        print(f"⚠️  Telegram: {pending} 段消息未发出，保留在队列中，下次运行继续发送")
+    elif sent:
+        print(f"✅ Telegram: {sent} 段消息全部发送成功")
+    return sent, failed, pending
+
+def run_stub_server(port=8081, rate_limit_every=0):
+    """
+    本地假 Bot API：接受 /bot<token>/sendMessage 并打印消息
+    rate_limit_every > 0 时每 N 个请求返回一次 429，用于测试重试逻辑
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    counter = {"n": 0}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            counter["n"] += 1
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not self.path.endswith("/sendMessage"):
+                return self._reply(404, {"ok": False, "description": "Not Found"})
+            if rate_limit_every and counter["n"] % rate_limit_every == 0:
+                return self._reply(429, {"ok": False, "error_code": 429,
+                                         "parameters": {"retry_after": 1}})
+            payload = json.loads(body or b"{}")
+            text = payload.get("text", "")
+            if len(text) > TELEGRAM_MAX_LENGTH:
+                return self._reply(400, {"ok": False, "description": "message is too long"})
+            print(f"--- #{counter['n']} ({len(text)} 字符, parse_mode={payload.get('parse_mode')}) ---")
+            print(text)
+            self._reply(200, {"ok": True, "result": {"message_id": counter["n"]}})
+
+        def _reply(self, status, data):
+            raw = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    print(f"🧪 假 Telegram Bot API 已启动: http://127.0.0.1:{port}")
+    HTTPServer(("127.0.0.1", port), StubHandler).serve_forever()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "flush"
+    if command == "stub":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8081
+        every = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        run_stub_server(port, every)
+    elif command == "flush":
+        sent, failed, pending = flush()
+        sys.exit(1 if failed or pending else 0)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+东证（JPX）交易日历
+休市日 = 周末 + 日本法定节假日（含振替休日、国民の休日）+ 年末年初（12/31 ~ 1/3）
+模块加载时预先计算 CALENDAR_START_YEAR ~ CALENDAR_END_YEAR 的全部交易日，
+存为有序的日期序数数组，查询用 bisect（O(log n)）
+
+命令行:
+    python3 trading_calendar.py 2026        # 列出当年休市的工作日
+"""
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+CALENDAR_START_YEAR = 2010
+CALENDAR_END_YEAR = 2050
+
+# 东证收盘时间（2024-11-05 起延长到 15:30）
+MARKET_CLOSE_HOUR = 15
+MARKET_CLOSE_MINUTE = 30
+
+# 特别年份的一次性节假日 / 移动
+SPECIAL_HOLIDAYS = {
+    date(2019, 4, 30): "国民の休日",
+    date(2019, 5, 1): "天皇の即位の日",
+    date(2019, 5, 2): "国民の休日",
+    date(2019, 10, 22): "即位礼正殿の儀の行われる日",
+}
+# 东京奥运会期间移动的节假日：年份 → {节日名: 日期}
+MOVED_HOLIDAYS = {
+    2020: {"海の日": date(2020, 7, 23), "スポーツの日": date(2020, 7, 24), "山の日": date(2020, 8, 10)},
+    2021: {"海の日": date(2021, 7, 22), "スポーツの日": date(2021, 7, 23), "山の日": date(2021, 8, 8)},
+}
+
+def _nth_monday(year, month, n):
+    """某月第 n 个周一"""
+    first = date(year, month, 1)
+    offset = (7 - first.weekday()) % 7
+    return first + timedelta(days=offset + 7 * (n - 1))
+
+def _vernal_equinox(year):
+    """春分日（1980~2099 年适用的近似公式）"""
+    return date(year, 3, int(20.8431 + 0.242194 * (year - 1980) - (year - 1980) // 4))
+
+def _autumnal_equinox(year):
+    """秋分日（1980~2099 年适用的近似公式）"""
+    return date(year, 9, int(23.2488 + 0.242194 * (year - 1980) - (year - 1980) // 4))
+
+def jp_holidays(year):
+    """计算某年的日本法定节假日，返回 {date: 名称}"""
+    moved = MOVED_HOLIDAYS.get(year, {})
+    holidays = {
+        date(year, 1, 1): "元日",
+        _nth_monday(year, 1, 2): "成人の日",
+        date(year, 2, 11): "建国記念の日",
+        _vernal_equinox(year): "春分の日",
+        date(year, 4, 29): "昭和の日",
+        date(year, 5, 3): "憲法記念日",
+        date(year, 5, 4): "みどりの日",
+        date(year, 5, 5): "こどもの日",
+        moved.get("海の日", _nth_monday(year, 7, 3)): "海の日",
+        _nth_monday(year, 9, 3): "敬老の日",
+        _autumnal_equinox(year): "秋分の日",
+        moved.get("スポーツの日", _nth_monday(year, 10, 2)): "スポーツの日" if year >= 2020 else "体育の日",
+        date(year, 11, 3): "文化の日",
+        date(year, 11, 23): "勤労感謝の日",
+    }
+    if year >= 2016:
+        holidays[moved.get("山の日", date(year, 8, 11))] = "山の日"
+    if year >= 2020:
+        holidays[date(year, 2, 23)] = "天皇誕生日"
+    elif year <= 2018:
+        holidays[date(year, 12, 23)] = "天皇誕生日"
+    for day, name in SPECIAL_HOLIDAYS.items():
+        if day.year == year:
+            holidays[day] = name
+
+    # 国民の休日：前后都是节假日的平日
+    for day in sorted(holidays):
+        sandwiched = day + timedelta(days=1)
+        if (sandwiched not in holidays and sandwiched.weekday() != 6
+                and sandwiched + timedelta(days=1) in holidays):
+            holidays[sandwiched] = "国民の休日"
+
+    # 振替休日：节假日落在周日时，之后第一个非节假日补休
+    for day in sorted(holidays):
+        if day.weekday() == 6:
+            substitute = day + timedelta(days=1)
+            while substitute in holidays:
+                substitute += timedelta(days=1)
+            holidays[substitute] = "振替休日"
+
+    return holidays
+
+def market_closures(year):
+    """某年东证休市的工作日（节假日 + 年末年初），返回 {date: 原因}"""
+    closures = {day: name for day, name in jp_holidays(year).items() if day.weekday() < 5}
+    for day in (date(year, 1, 1), date(year, 1, 2), date(year, 1, 3), date(year, 12, 31)):
+        if day.weekday() < 5:
+            closures.setdefault(day, "年末年始休業日")
+    return closures
+
+def _build_trading_days(start_year, end_year):
+    """预计算交易日的日期序数（有序数组）"""
+    closed = set()
+    for year in range(start_year, end_year + 1):
+        closed.update(d.toordinal() for d in market_closures(year))
+    first = date(start_year, 1, 1).toordinal()
+    last = date(end_year, 12, 31).toordinal()
+    return array("i", (
+        o for o in range(first, last + 1)
+        if o not in closed and date.fromordinal(o).weekday() < 5
+    ))
+
+TRADING_DAYS = _build_trading_days(CALENDAR_START_YEAR, CALENDAR_END_YEAR)
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    return value
+
+def _check_range(day):
+    if not CALENDAR_START_YEAR <= day.year <= CALENDAR_END_YEAR:
+        raise ValueError(f"{day} 超出交易日历范围 {CALENDAR_START_YEAR}~{CALENDAR_END_YEAR}")
+
+def is_trading_day(day):
+    """是否为东证交易日（day 可以是 date / datetime / 'YYYY-MM-DD'）"""
+    day = _to_date(day)
+    _check_range(day)
+    o = day.toordinal()
+    i = bisect_left(TRADING_DAYS, o)
+    return i < len(TRADING_DAYS) and TRADING_DAYS[i] == o
+
+def next_trading_day(day, inclusive=False):
+    """下一个交易日；inclusive=True 时 day 本身是交易日则返回 day"""
+    day = _to_date(day)
+    _check_range(day)
+    o = day.toordinal()
+    i = bisect_left(TRADING_DAYS, o) if inclusive else bisect_right(TRADING_DAYS, o)
+    if i >= len(TRADING_DAYS):
+        raise ValueError(f"{day} 之后的交易日超出交易日历范围")
+    return date.fromordinal(TRADING_DAYS[i])
+
+def previous_trading_day(day, inclusive=False):
+    """上一个交易日；inclusive=True 时 day 本身是交易日则返回 day"""
+    day = _to_date(day)
+    _check_range(day)
+    o = day.toordinal()
+    i = (bisect_right(TRADING_DAYS, o) if inclusive else bisect_left(TRADING_DAYS, o)) - 1
+    if i < 0:
+        raise ValueError(f"{day} 之前的交易日超出交易日历范围")
+    return date.fromordinal(TRADING_DAYS[i])
+
+def trading_days_between(start, end):
+    """[start, end] 区间内的交易日数量"""
+    start, end = _to_date(start), _to_date(end)
+    return bisect_right(TRADING_DAYS, end.toordinal()) - bisect_left(TRADING_DAYS, start.toordinal())
+
+def session_has_closed(day, now=None):
+    """某个交易日是否已经收盘（可以拿到收盘价）"""
+    now = now or datetime.now()
+    day = _to_date(day)
+    if day != now.date():
+        return day < now.date()
+    return (now.hour, now.minute) >= (MARKET_CLOSE_HOUR, MARKET_CLOSE_MINUTE)
+
+if __name__ == "__main__":
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else datetime.now().year
+    closures = market_closures(year)
+    print(f"📅 {year} 年东证休市的工作日（共 {len(closures)} 天）:")
+    for day in sorted(closures):
+        print(f"  {day}  {'月火水木金土日'[day.weekday()]}  {closures[day]}")
+    print(f"📈 {year} 年交易日: {trading_days_between(date(year, 1, 1), date(year, 12, 31))} 天")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+东证股票代码主表
+加载 代码 → (公司名称, 33业种, 规模区分)，用于校验/补全模型给出的股票代码，以及回测中的板块聚合
+- 优先使用刷新得到的 data/tse_tickers.local.csv（不纳入版本管理）
+- 不存在时使用仓库自带的种子名单 data/tse_tickers.csv
+
+刷新主表（从 JPX 官方上市公司一览下载，需要 pandas + xlrd；只写 .local 文件，不改动仓库中的种子名单）:
+    python3 tse_tickers.py refresh
+查询:
+    python3 tse_tickers.py 8035.T
+"""
+import csv
+import io
+import json
+import os
+import re
+import sys
+from collections import namedtuple
+from datetime import datetime
+
+from storage import atomic_write_text, atomic_write_json
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SEED_MASTER_FILE = os.path.join(DATA_DIR, "tse_tickers.csv")
+SEED_META_FILE = os.path.join(DATA_DIR, "tse_tickers.meta.json")
+# 刷新结果写到未跟踪的文件，避免 main 分支工作区出现改动导致 push_results.sh 切换分支失败
+LOCAL_MASTER_FILE = os.path.join(DATA_DIR, "tse_tickers.local.csv")
+LOCAL_META_FILE = os.path.join(DATA_DIR, "tse_tickers.local.meta.json")
+
+# JPX「東証上場銘柄一覧」（每月更新）
+JPX_LIST_URL = "https://www.jpx.co.jp/markets/statistics-equities/misc/tvdivq0000001vg2-att/data_j.xls"
+
+# 证券代码：4位，JPX 自 2024 年起发行含英文字母的代码（第2、4位可为字母，如 285A）
+TICKER_CODE = r'\d[0-9A-Z]\d[0-9A-Z]'
+# Yahoo Finance 日股代码格式：证券代码.T
+TICKER_PATTERN = re.compile(rf'^{TICKER_CODE}\.T$')
+
+# JPX 规模区分 → 主表中的简写
+SIZE_TIERS = {
+    "TOPIX Core30": "core30",
+    "TOPIX Large70": "large70",
+    "TOPIX Mid400": "mid400",
+    "TOPIX Small 1": "small",
+    "TOPIX Small 2": "small",
+}
+
+TickerInfo = namedtuple("TickerInfo", ["name", "sector", "size"])
+
+_master = None
+_complete = None
+
+def master_files():
+    """当前使用的 (主表, 元数据) 路径：有刷新结果时用 .local 文件，否则用种子名单"""
+    if os.path.exists(LOCAL_MASTER_FILE):
+        return LOCAL_MASTER_FILE, LOCAL_META_FILE
+    return SEED_MASTER_FILE, SEED_META_FILE
+
+def load_ticker_master(path=None):
+    """加载股票主表，返回 {"8035.T": TickerInfo(name, sector, size), ...}"""
+    path = path or master_files()[0]
+    master = {}
+    if not os.path.exists(path):
+        print(f"⚠️  股票主表不存在: {path}")
+        return master
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            code = (row.get("code") or "").strip()
+            if code:
+                master[f"{code}.T"] = TickerInfo(
+                    (row.get("name") or "").strip(),
+                    (row.get("sector") or "").strip() or "未知",
+                    (row.get("size") or "").strip() or "other",
+                )
+    return master
+
+def load_master_meta(path=None):
+    """读取主表元数据（来源/更新时间）"""
+    path = path or master_files()[1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"source": "seed"}
+
+def get_ticker_master():
+    """获取（惰性加载的）股票主表"""
+    global _master
+    if _master is None:
+        _master = load_ticker_master()
+    return _master
+
+def is_master_complete():
+    """
+    主表是否为 JPX 全量名单
+    仓库自带的是大型股种子名单，只有刷新后的全量名单才能判定"代码不存在"
+    """
+    global _complete
+    if _complete is None:
+        _complete = load_master_meta().get("source") == "jpx"
+    return _complete
+
+def normalize_ticker(code):
+    """规范化股票代码：'8035' / '8035.t' / ' 285a.T ' → '8035.T' / '285A.T'，格式不对返回 None"""
+    if not code:
+        return None
+    code = str(code).strip().upper()
+    if re.fullmatch(TICKER_CODE, code):
+        code = f"{code}.T"
+    return code if TICKER_PATTERN.match(code) else None
+
+def is_known_ticker(code):
+    """代码是否在主表中"""
+    return code in get_ticker_master()
+
+def is_possible_ticker(code):
+    """
+    代码是否可能存在：格式正确，且（主表为全量名单时）在主表中
+    种子名单模式下无法排除主表外的代码，只做格式校验
+    """
+    code = normalize_ticker(code)
+    if not code:
+        return False
+    return is_known_ticker(code) or not is_master_complete()
+
+def get_ticker_info(code):
+    """返回 TickerInfo，不存在返回 None"""
+    return get_ticker_master().get(code)
+
+def get_ticker_name(code):
+    """返回主表中的公司名称，不存在返回 None"""
+    info = get_ticker_info(code)
+    return info.name if info else None
+
+def get_ticker_sector(code):
+    """返回 33业种，不存在返回 "未知" """
+    info = get_ticker_info(code)
+    return info.sector if info else "未知"
+
+def enrich_prediction(item):
+    """用主表补全单条预测的 name / sector / size（原地修改并返回）"""
+    info = get_ticker_info(item.get("stock_code"))
+    if info:
+        item["name"] = info.name
+        item["sector"] = info.sector
+        item["size"] = info.size
+    return item
+
+def refresh_ticker_master(source=JPX_LIST_URL, path=LOCAL_MASTER_FILE, meta_path=LOCAL_META_FILE):
+    """
+    从 JPX 上市公司一览（data_j.xls）重建主表
+    source 可以是 URL 或本地文件路径；只保留有 33业种 的股票（排除 ETF/REIT 等）
+    """
+    try:
+        import pandas as pd
+    except ImportError:
+        print("❌ 刷新主表需要 pandas 和 xlrd: pip install pandas xlrd")
+        return False
+
+    print(f"📥 正在读取 JPX 上市公司一览: {source}")
+    try:
+        if source.startswith("http"):
+            import requests
+            res = requests.get(source, headers={"User-Agent": "Mozilla/5.0"}, timeout=60)
+            res.raise_for_status()
+            df = pd.read_excel(io.BytesIO(res.content), dtype=str)
+        else:
+            df = pd.read_excel(source, dtype=str)
+    except Exception as e:
+        print(f"❌ 读取失败: {e}")
+        return False
+
+    rows = []
+    for _, r in df.iterrows():
+        code = str(r.get("コード", "")).strip()
+        sector = str(r.get("33業種区分", "")).strip()
+        if not code or sector in ("", "-", "nan"):
+            continue
+        size = SIZE_TIERS.get(str(r.get("規模区分", "")).strip(), "other")
+        rows.append([code, str(r.get("銘柄名", "")).strip(), sector, size])
+
+    if not rows:
+        print("❌ 未解析到任何股票，保留原主表")
+        return False
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["code", "name", "sector", "size"])
+    writer.writerows(sorted(rows))
+    atomic_write_text(path, buffer.getvalue())
+
+    meta = {"source": "jpx", "url": source, "count": len(rows), "updated": datetime.now().isoformat()}
+    atomic_write_json(meta_path, meta)
+
+    global _master, _complete
+    _master, _complete = None, None
+    print(f"✅ 股票主表已更新: {len(rows)} 只股票 → {path}")
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "refresh":
+        ok = refresh_ticker_master(sys.argv[2] if len(sys.argv) >= 3 else JPX_LIST_URL)
+        sys.exit(0 if ok else 1)
+
+    master = get_ticker_master()
+    meta = load_master_meta()
+    print(f"📚 股票主表: {len(master)} 只（来源: {meta.get('source')}，更新: {meta.get('updated', '-')}，文件: {master_files()[0]}）")
+    for arg in sys.argv[1:]:
+        code = normalize_ticker(arg)
+        info = get_ticker_info(code) if code else None
+        if info:
+            print(f"  {code}  {info.name}  {info.sector}  {info.size}")
+        else:
+            print(f"  {arg}  {'可能存在（不在种子名单中）' if is_possible_ticker(arg) else '不存在'}")
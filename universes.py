@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+预测 universe（新闻源 + 研判方向）定义
+- 默认 universe "tse"：Yahoo!ファイナンス 全部商业新闻，研判全市场个股，文件路径与单 universe 时完全相同
+- 其他 universe 在 universes.json 中定义（格式见 universes.example.json），
+  预测文件、报告目录、周末缓存都放在以 universe 名命名的子目录中：
+      predictions/<名称>/prediction_YYYY-MM-DD.json
+      report_YYYYMMDD/<名称>/
+      weekend_cache/<名称>/
+- feeds 必须是与默认新闻源结构相同的 Yahoo!ファイナンス 新闻列表页
+
+命令行:
+    python3 universes.py            # 列出已定义的 universe
+"""
+import json
+import os
+import re
+from collections import namedtuple
+from pathlib import Path
+
+UNIVERSES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "universes.json")
+PREDICTIONS_DIR = "./predictions"
+
+DEFAULT_UNIVERSE = "tse"
+DEFAULT_FEED = "https://finance.yahoo.co.jp/news/bus_all"
+
+# name: 目录名；label: 报告/消息中显示的名称；feeds: 新闻列表页；focus: 写入初筛和研判 prompt 的关注方向（空为全市场）
+Universe = namedtuple("Universe", ["name", "label", "feeds", "focus"])
+
+BUILTIN_UNIVERSES = {
+    DEFAULT_UNIVERSE: Universe(DEFAULT_UNIVERSE, "日股综合", (DEFAULT_FEED,), ""),
+}
+
+NAME_PATTERN = re.compile(r"^[a-z0-9_-]+$")
+
+_universes = None
+
+def load_universes(path=UNIVERSES_FILE):
+    """内置 universe + universes.json（同名时以文件为准），返回 {名称: Universe}"""
+    universes = dict(BUILTIN_UNIVERSES)
+    if not os.path.exists(path):
+        return universes
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    for entry in entries:
+        name = entry["name"]
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"universe 名称只能包含小写字母、数字、- 和 _: {name}")
+        if is_backup(name):
+            raise ValueError(f"universe 名称不能包含 backup（与预测备份目录冲突）: {name}")
+        universes[name] = Universe(name, entry.get("label", name),
+                                   tuple(entry.get("feeds") or (DEFAULT_FEED,)), entry.get("focus", ""))
+    return universes
+
+def get_universes():
+    global _universes
+    if _universes is None:
+        _universes = load_universes()
+    return _universes
+
+def get_universe(name=None):
+    """按名称取 universe（None 为默认），不存在时抛出 KeyError"""
+    name = name or DEFAULT_UNIVERSE
+    universes = get_universes()
+    if name not in universes:
+        raise KeyError(f"未定义的 universe: {name}（可选: {', '.join(universes)}）")
+    return universes[name]
+
+def is_default(name):
+    return not name or name == DEFAULT_UNIVERSE
+
+def universe_path(base, name):
+    """默认 universe 直接使用 base，其他 universe 使用 base/<名称>"""
+    return base if is_default(name) else os.path.join(base, name)
+
+def prediction_path(date_str, name=None, predictions_dir=PREDICTIONS_DIR):
+    return os.path.join(universe_path(predictions_dir, name), f"prediction_{date_str}.json")
+
+def is_backup(name):
+    """predictions/ 下的备份文件或目录（如 backup/）不属于任何 universe"""
+    return "backup" in name
+
+def iter_prediction_files(predictions_dir=PREDICTIONS_DIR):
+    """
+    遍历全部 universe 的预测文件，产出 (universe 名称, Path)，按 universe、日期排序
+    跳过备份文件和备份目录（回测、清理、信号索引重建都不应处理备份）
+    """
+    root = Path(predictions_dir)
+    if not root.is_dir():
+        return
+    for path in sorted(root.glob("prediction_*.json")):
+        if not is_backup(path.name):
+            yield DEFAULT_UNIVERSE, path
+    for sub in sorted(p for p in root.iterdir()
+                      if p.is_dir() and NAME_PATTERN.match(p.name) and not is_backup(p.name)):
+        for path in sorted(sub.glob("prediction_*.json")):
+            if not is_backup(path.name):
+                yield sub.name, path
+
+def processed_key(name, date):
+    """回测已处理记录的键：默认 universe 仍为日期本身（兼容旧统计），其他为 <名称>/<日期>"""
+    return date if is_default(name) else f"{name}/{date}"
+
+if __name__ == "__main__":
+    for u in get_universes().values():
+        print(f"{u.name:<16} {u.label:<12} 关注: {u.focus or '全市场'}")
+        for feed in u.feeds:
+            print(f"    · {feed}")